@@ -2,163 +2,147 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import os
-from google.cloud import bigquery
+
+from fleet import APP_COLUMNS, fleet_store, load_fleet
+from fleet_kpis import histogram_figure, load_fleet_kpis
+from fleet_map import MAP_MODES, build_map_figure
+from instrumentation import checkpoint, plotly_chart, show_trace, start_trace
+from memory_report import cached_objects_report, frame_memory
 
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"C:\Users\floch\OneDrive\Documents\GCP_key\streamlit_app\beem-data-warehouse-14a923c674a0.json"
 
 st.set_page_config(page_title="Infos Batteries", layout="wide")
 st.title("📋 Informations parc batteries")
+trace = start_trace("app")
 
-@st.cache_data
-def load_info():
-    client = bigquery.Client()
-    query = """
-        WITH device_user_data AS (
-     SELECT 
-        *
-      FROM `beem-data-warehouse.airbyte_postgresql.battery_device` AS d
-      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.battery_live_data` AS ld ON ld.battery_id = d.id
-      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.house_user` AS hu ON d.house_id = hu.house_id 
-      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.user` AS u ON hu.user_id = u.id
-      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.house` AS h ON h.id = hu.house_id
-      WHERE d.deleted_at IS NULL
-        AND d.replaced_by_id IS NULL
-        AND d.warranty_status = 'activated'
-        AND d.serial_number NOT IN ('021LOLL190154M','021LOLF080008M')
-        --AND u.id NOT IN (22, 4395, 34538)
-        --AND d.hardware_version = 'ampace_v1'
-    ),
-
-    serial_counts AS (
-      SELECT 
-        serial_number,
-        COUNT(*) AS nb
-      FROM device_user_data
-      GROUP BY serial_number
-    ),
-    final AS (
-      SELECT dud.*
-      FROM device_user_data dud
-      JOIN serial_counts sc ON dud.serial_number = sc.serial_number
-      WHERE 
-        -- si le serial est unique, on garde tout
-        sc.nb = 1
-
-        -- si le serial est dupliqué, on garde seulement si email ne se termine pas par @beemenergy
-        OR (
-        sc.nb > 1
-       AND dud.email NOT LIKE '%@beemenergy.com'
-        AND dud.email NOT LIKE '%@beemenergy.fr'
-      )
-    )
-    SELECT * FROM final;
-    """
-    return client.query(query).to_dataframe()
- 
-df = load_info()
+df = load_fleet(APP_COLUMNS)
+store = fleet_store()
+st.caption(
+    f"Inventaire chargé le {store.loaded_at:%d/%m/%Y à %H:%M} UTC "
+    f"(dernière vérification de synchronisation à {store.refreshed_at:%H:%M} UTC)"
+)
+checkpoint("chargement")
+
+# ========== 🧠 Mémoire (optionnel) ==========
+if st.sidebar.checkbox("🧠 Rapport mémoire"):
+    include_lazy = st.sidebar.checkbox("Inclure réalisation et logs (les charge si besoin)")
+    objects = cached_objects_report(include_lazy)
+    st.sidebar.metric("Total objets en cache", f"{objects['octets'].sum() / 1e6:.1f} Mo")
+    st.sidebar.dataframe(objects, use_container_width=True, hide_index=True)
+    st.sidebar.caption("Inventaire : octets par colonne")
+    st.sidebar.dataframe(frame_memory(store.df), use_container_width=True, hide_index=True)
+    checkpoint("mémoire")
 
 # =================================
 # 🗺️ Carte interactive
 # =================================
 st.subheader("🗺️ Carte des batteries par mode de fonctionnement")
 
-df["clean_mode"] = df["working_mode_code"].fillna("Inconnu").astype(str)
-df["clean_mode"] = df["clean_mode"].str.replace(r"^ampace_v[12]_", "", regex=True)
-
-df["point_size"] = 7  
-
-fig_map = px.scatter_mapbox(
-    df,
-    lat="latitude",
-    lon="longitude",
-    color="clean_mode",
-    hover_name="lastname",
-    size="point_size",
-    hover_data=["id", "hardware_version", "nb_cycles"],  # ici 'id' remplace 'device_id'
-    zoom=5,
-    height=600
+# Agrégation côté serveur : grappes par cellule de grille, points individuels une fois zoomé
+located = df.dropna(subset=["latitude", "longitude"])
+cities = sorted(located["city"].dropna().unique().tolist())
+
+col_map1, col_map2, col_map3 = st.columns(3)
+with col_map1:
+    map_mode = st.radio(
+        "Affichage",
+        MAP_MODES,
+        format_func={"auto": "Automatique", "clusters": "Grappes", "points": "Batteries"}.get,
+        horizontal=True,
+    )
+with col_map2:
+    center_city = st.selectbox("Centrer sur", ["Tout le parc"] + cities)
+with col_map3:
+    map_zoom = st.slider("Niveau de zoom", 3, 14, 5 if center_city == "Tout le parc" else 10)
+
+center_rows = located if center_city == "Tout le parc" else located[located["city"] == center_city]
+map_center = (center_rows["latitude"].mean(), center_rows["longitude"].mean())
+
+fig_map, (n_visible, n_markers, clustered) = build_map_figure(located, map_zoom, map_center, map_mode)
+st.caption(
+    f"{n_visible} batteries dans la vue, {n_markers} "
+    + ("grappes affichées" if clustered else "marqueurs affichés")
 )
 
-fig_map.update_layout(mapbox_style="open-street-map")
-fig_map.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
-
-st.plotly_chart(fig_map, use_container_width=True)
+plotly_chart(fig_map, "carte", use_container_width=True)
+checkpoint("carte")
 
 # =================================
 # 🔧 Versions matérielles
 # =================================
 st.subheader("🔧 Versions matérielles")
-nb_v1 = (df["hardware_version"] == "ampace_v1").sum()
-nb_v2 = (df["hardware_version"] == "ampace_v2").sum()
+
+# Agrégats calculés une fois par version de l'inventaire : les graphes ne reçoivent que les effectifs
+kpis = load_fleet_kpis()
+nb_v1 = int(kpis["hardware"].get("ampace_v1", 0))
+nb_v2 = int(kpis["hardware"].get("ampace_v2", 0))
 
 col1, col2 = st.columns(2)
 with col1:
     st.metric("Ampace V1", nb_v1)
 with col2:
     st.metric("Ampace V2", nb_v2)
+checkpoint("versions")
 
 # =================================
 # 🧩 État de santé et cycles
 # =================================
 st.subheader("🧩 État de santé et cycles")
 
-df["global_soh"] = pd.to_numeric(df["global_soh"], errors="coerce")
-df["nb_cycles"] = pd.to_numeric(df["nb_cycles"], errors="coerce").fillna(0)
-
 col3, col4 = st.columns(2)
 
 with col3:
-    fig_soh = px.histogram(
-        df,
-        x="global_soh",
-        nbins=20,
-        title="Histogramme de l'état de santé (SOH %)",
-        labels={"global_soh": "SOH (%)"},
-    )
-    st.plotly_chart(fig_soh, use_container_width=True)
+    fig_soh = histogram_figure(kpis["soh"], "Histogramme de l'état de santé (SOH %)", "SOH (%)")
+    plotly_chart(fig_soh, "soh", use_container_width=True)
 
 with col4:
-    fig_cycles = px.histogram(
-        df, x="nb_cycles", nbins=20,
-        title="Histogramme du nombre de cycles",
-        labels={"nb_cycles": "Nombre de cycles"},
-    )
-    st.plotly_chart(fig_cycles, use_container_width=True)
+    fig_cycles = histogram_figure(kpis["cycles"], "Histogramme du nombre de cycles", "Nombre de cycles")
+    plotly_chart(fig_cycles, "cycles", use_container_width=True)
+checkpoint("santé et cycles")
 
 # =================================
 # 🔋 Répartition du nombre de modules
 # =================================
 st.subheader("🔋 Répartition du nombre de modules")
 
+modules_counts = kpis["modules"]
 fig_modules = px.pie(
-    names=df["nb_modules"].fillna("Inconnu").astype(str).value_counts().index,
-    values=df["nb_modules"].fillna("Inconnu").astype(str).value_counts().values,
+    names=modules_counts.index,
+    values=modules_counts.values,
     title="Répartition du nombre de modules",
 )
-st.plotly_chart(fig_modules, use_container_width=True)
+plotly_chart(fig_modules, "modules", use_container_width=True)
+checkpoint("modules")
 
 # =================================
 # ⚙️ Répartition des modes de fonctionnement par version
 # =================================
 st.subheader("⚙️ Modes de fonctionnement par version")
 
-df_v1 = df[df["hardware_version"] == "ampace_v1"]
-df_v2 = df[df["hardware_version"] == "ampace_v2"]
+# Tableau croisé version x mode : on ne garde que les modes présents
+modes = kpis["modes"]
+modes_v1 = modes.loc["ampace_v1"] if "ampace_v1" in modes.index else pd.Series(dtype=int)
+modes_v1 = modes_v1[modes_v1 > 0]
+modes_v2 = modes.loc["ampace_v2"] if "ampace_v2" in modes.index else pd.Series(dtype=int)
+modes_v2 = modes_v2[modes_v2 > 0]
 
 col5, col6 = st.columns(2)
 
 with col5:
     fig_mode_v1 = px.pie(
-        names=df_v1["clean_mode"].value_counts().index,
-        values=df_v1["clean_mode"].value_counts().values,
+        names=modes_v1.index,
+        values=modes_v1.values,
         title="Modes de fonctionnement (Ampace V1)",
     )
-    st.plotly_chart(fig_mode_v1, use_container_width=True)
+    plotly_chart(fig_mode_v1, "modes_v1", use_container_width=True)
 
 with col6:
     fig_mode_v2 = px.pie(
-        names=df_v2["clean_mode"].value_counts().index,
-        values=df_v2["clean_mode"].value_counts().values,
+        names=modes_v2.index,
+        values=modes_v2.values,
         title="Modes de fonctionnement (Ampace V2)",
     )
-    st.plotly_chart(fig_mode_v2, use_container_width=True)
+    plotly_chart(fig_mode_v2, "modes_v2", use_container_width=True)
+checkpoint("modes")
+
+show_trace(trace)
@@ -0,0 +1,235 @@
+"""Benchmark reproductible des deux pages, sans navigateur.
+
+Génère un parc synthétique (``bench/synthetic.py``), pointe le backend
+``snapshot`` dessus puis chronomètre chaque phase de ``app.py`` et de la page
+zoom : chargement, transformations, construction des figures et taille du
+payload envoyé au navigateur. Les résultats sont écrits en JSON pour comparer
+les versions entre elles.
+
+    python bench/run_bench.py --devices 1000 10000 100000 --output bench_results.json
+    python bench/run_bench.py --devices 1000 --apptest   # exécute aussi les pages via AppTest
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import synthetic  # noqa: E402
+
+
+class Recorder:
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.results = []
+
+    @contextmanager
+    def phase(self, page, name):
+        entry = {**self.scenario, "page": page, "phase": name}
+        start = time.perf_counter()
+        yield entry
+        entry["seconds"] = round(time.perf_counter() - start, 6)
+        self.results.append(entry)
+
+
+def payload_bytes(*figures):
+    return sum(len(fig.to_json()) for fig in figures)
+
+
+def bench_app(rec):
+    import plotly.express as px
+
+    import fleet
+    import fleet_kpis
+    from fleet_map import build_map_figure
+
+    fleet.fleet_store.clear()
+    with rec.phase("app", "load") as entry:
+        df = fleet.load_fleet(fleet.APP_COLUMNS)
+        entry["rows"] = len(df)
+    with rec.phase("app", "load_warm"):
+        df = fleet.load_fleet(fleet.APP_COLUMNS)
+
+    with rec.phase("app", "transform"):
+        located = df.dropna(subset=["latitude", "longitude"])
+        center = (located["latitude"].mean(), located["longitude"].mean())
+        fleet_kpis._load_kpis.clear()
+        kpis = fleet_kpis.load_fleet_kpis()
+
+    with rec.phase("app", "figure_map") as entry:
+        fig_map, (_, n_markers, _) = build_map_figure(located, 5, center)
+        entry["markers"] = n_markers
+    with rec.phase("app", "figure_kpis"):
+        figures = [
+            fleet_kpis.histogram_figure(kpis["soh"], "SOH", "SOH (%)"),
+            fleet_kpis.histogram_figure(kpis["cycles"], "Cycles", "Nombre de cycles"),
+            px.pie(names=kpis["modules"].index, values=kpis["modules"].values),
+            *(px.pie(names=row.index, values=row.values) for _, row in kpis["modes"].iterrows()),
+        ]
+    with rec.phase("app", "payload") as entry:
+        entry["payload_bytes"] = payload_bytes(fig_map, *figures)
+
+
+def bench_zoom(rec, start, days):
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    import fleet
+    import logs
+    import realisation
+    import timeseries
+    from downsampling import downsample
+    from measures import sources
+    from rollups import choose_resolution, rollup_watermark
+
+    with rec.phase("zoom", "fleet_index"):
+        fleet_index = fleet.FleetIndex(fleet.load_fleet_index().df)
+    with rec.phase("zoom", "selectors"):
+        for name in fleet_index.search_lastnames("", limit=50):
+            fleet_index.devices(lastname=name)
+    # Les premiers devices générés sont ceux qui ont des mesures
+    device_id = 1
+
+    realisation.load_realisation.clear()
+    with rec.phase("zoom", "realisation_load") as entry:
+        table, _ = realisation.load_realisation()
+        entry["rows"] = len(table)
+    with rec.phase("zoom", "realisation_lookup"):
+        realisation.device_realisation(device_id)
+
+    start_dt = pd.Timestamp(start).isoformat()
+    end_dt = (pd.Timestamp(start) + pd.Timedelta(days=days) - pd.Timedelta(microseconds=1)).isoformat()
+    timeseries._cache.clear()
+    rollup_watermark.clear()
+    with rec.phase("zoom", "measures_load") as entry:
+        device_series = timeseries.get_device_series(device_id, start_dt, end_dt)
+        loaded = [s for _, s, error in device_series.fetch(list(sources)) if error is None]
+        entry["rows"] = sum(len(s) for s in loaded)
+    with rec.phase("zoom", "measures_warm"):
+        list(timeseries.get_device_series(device_id, start_dt, end_dt).fetch(list(sources)))
+    with rec.phase("zoom", "measures_rollup") as entry:
+        entry["resolution"] = resolution = choose_resolution(start_dt, end_dt, min_points=100)
+        rolled = timeseries.get_device_series(device_id, start_dt, end_dt, resolution)
+        loaded = [s for _, s, error in rolled.fetch(list(sources)) if error is None]
+        entry["rows"] = sum(len(s) for s in loaded)
+
+    with rec.phase("zoom", "figure_measures"):
+        fig = go.Figure([
+            go.Scatter(x=w.index, y=w.to_numpy(), mode="lines")
+            for w in (downsample(device_series.get(t)) for t in sources)
+        ])
+    with rec.phase("zoom", "nearest_hourly"):
+        marks = pd.date_range(start, periods=days * 24, freq="h", tz="UTC")
+        device_series.values_at(marks, list(sources))
+
+    logs.load_log_index.clear()
+    with rec.phase("zoom", "logs_load") as entry:
+        log_index = logs.load_log_index()
+        entry["rows"] = len(log_index)
+    with rec.phase("zoom", "logs_device"):
+        logs.summarize(log_index.for_device(device_id))
+
+    with rec.phase("zoom", "payload") as entry:
+        entry["payload_bytes"] = payload_bytes(fig)
+
+
+def bench_apptest(rec):
+    from streamlit.testing.v1 import AppTest
+
+    for page, path in (("app", "app.py"), ("zoom", "pages/dashboard_zoom_battery.py")):
+        with rec.phase(page, "apptest_run") as entry:
+            at = AppTest.from_file(str(ROOT / path), default_timeout=600).run()
+            entry["exceptions"] = [str(e.value) for e in at.exception]
+
+
+def max_rss_mb():
+    """Pic de mémoire résidente du process en Mo (None si indisponible, ex. Windows)."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sur macOS, en Ko ailleurs
+    unit = 1 if sys.platform == "darwin" else 1024
+    return round(max_rss * unit / 2**20, 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des pages sur un parc synthétique")
+    parser.add_argument("--devices", type=int, nargs="+", default=[1000])
+    parser.add_argument("--measure-devices", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--step-minutes", type=int, default=15)
+    parser.add_argument("--start", default="2025-04-01")
+    parser.add_argument("--apptest", action="store_true", help="exécute aussi les pages via streamlit AppTest")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    os.environ["BEEM_DATA_SOURCE"] = "snapshot"
+    # Chargements mesurés au premier plan uniquement
+    os.environ["BEEM_FLEET_REFRESH_S"] = "0"
+    # Le parc synthétique matérialise ses agrégats
+    os.environ["BEEM_ROLLUPS"] = "1"
+    results = []
+    for n_devices in args.devices:
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            os.environ["BEEM_SNAPSHOT_DIR"] = snapshot_dir
+            import data_source
+
+            data_source.get_data_source.cache_clear()
+            scenario = {
+                "devices": n_devices, "measure_devices": min(args.measure_devices, n_devices),
+                "days": args.days, "step_minutes": args.step_minutes,
+            }
+            rec = Recorder(scenario)
+            with rec.phase("setup", "generate") as entry:
+                entry["rows"] = synthetic.generate(
+                    snapshot_dir, n_devices, scenario["measure_devices"], args.days,
+                    args.step_minutes, args.start,
+                )
+            bench_app(rec)
+            bench_zoom(rec, args.start, args.days)
+            if args.apptest:
+                bench_apptest(rec)
+            results.extend(rec.results)
+            for entry in rec.results:
+                print(f"{n_devices:>7} {entry['page']:>6} {entry['phase']:<20} {entry['seconds']:>9.3f} s")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "max_rss_mb": max_rss_mb(),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2, default=str))
+    print(f"📄 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
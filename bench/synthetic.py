@@ -0,0 +1,203 @@
+"""Générateur de parc synthétique au format du snapshot local.
+
+Produit les mêmes tables que ``data_source.SnapshotSource`` (inventaire,
+objectifs, production mensuelle, logs, les cinq tables de mesures et leurs
+agrégats) pour une taille de parc et une durée de séries configurables. Les
+valeurs catégorielles (modes, versions, villes, noms) sont tirées des exports
+CSV quand ils sont présents, pour garder des cardinalités réalistes.
+
+    python bench/synthetic.py --devices 10000 --measure-devices 200 --days 30 --out snapshot_bench
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from data_source import FLEET_COLUMNS, MEASURE_TABLES, SnapshotSource  # noqa: E402
+from rollups import materialize_snapshot  # noqa: E402
+
+DEFAULT_POOLS = {
+    "hardware_version": ["ampace_v1", "ampace_v2"],
+    "working_mode_code": [
+        "ampace_v1_on_grid_discharge", "ampace_v1_self_consumption",
+        "ampace_v2_self_consumption", "ampace_v2_on_grid_discharge",
+    ],
+    "firmware_version": ["3.0.2", "3.1.2", "3.2.0"],
+    "city": ["Paris", "Lyon", "Caen", "Nantes", "Bordeaux", "Toulouse"],
+    "lastname": ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard"],
+    "firstname": ["Marie", "Jean", "Pierre", "Sophie", "Luc", "Claire"],
+}
+LOG_MESSAGES = ["grid_lost", "bms_over_temperature", "battery_low_voltage", "meter_communication_lost"]
+
+
+def value_pools(csv_dir=ROOT):
+    """Valeurs catégorielles tirées de l'export d'inventaire s'il existe."""
+    pools = dict(DEFAULT_POOLS)
+    path = Path(csv_dir) / "battery_actives_infos.csv"
+    if path.exists():
+        infos = pd.read_csv(path, usecols=lambda c: c in pools)
+        for col in infos.columns:
+            values = infos[col].dropna().astype(str).unique().tolist()
+            if values:
+                pools[col] = values
+    return pools
+
+
+def fleet_inventory(n_devices, rng, pools):
+    ids = np.arange(1, n_devices + 1)
+    hardware = rng.choice(pools["hardware_version"], n_devices)
+    df = pd.DataFrame({
+        "device_id": ids,
+        "serial_number": [f"021LOL{i:08d}M" for i in ids],
+        "hardware_version": hardware,
+        "created_at": pd.Timestamp("2023-01-01", tz="UTC")
+        + pd.to_timedelta(rng.integers(0, 800, n_devices), unit="D"),
+        "warranty_status": "activated",
+        "reversed_ct": rng.random(n_devices) < 0.02,
+        "firmware_version": rng.choice(pools["firmware_version"], n_devices),
+        "firmware_versions": [
+            json.dumps({"bms": "1.7", "dcac": "410.30", "dcdc": "406.06", "dataLogger": "4.1.0.34"})
+        ] * n_devices,
+        "component_serial_numbers": [
+            json.dumps({"modules": [{"id": m, "sn": f"5191{i:012d}{m:04d}"} for m in (1, 2)]})
+            for i in ids
+        ],
+        "soc": rng.integers(0, 101, n_devices),
+        "capacity": rng.choice([6.6, 10.0, 13.3], n_devices),
+        "nb_cycles": rng.integers(0, 600, n_devices),
+        "global_soh": rng.integers(85, 101, n_devices),
+        "nb_modules": rng.integers(2, 5, n_devices),
+        "working_mode_code": rng.choice(pools["working_mode_code"], n_devices),
+        "last_known_measure_date": pd.Timestamp("2025-04-30", tz="UTC"),
+        "_airbyte_extracted_at": pd.Timestamp("2025-04-30 02:24", tz="UTC"),
+        "user_id": ids + 10_000,
+        "lastname": [
+            f"{name}{suffix}" for name, suffix in
+            zip(rng.choice(pools["lastname"], n_devices), rng.integers(0, max(n_devices // 3, 1), n_devices))
+        ],
+        "firstname": rng.choice(pools["firstname"], n_devices),
+        "email": [f"user{i}@example.com" for i in ids],
+        "city": rng.choice(pools["city"], n_devices),
+        "zipcode": rng.integers(1000, 96000, n_devices),
+        "latitude": rng.uniform(43.0, 50.5, n_devices),
+        "longitude": rng.uniform(-4.0, 7.5, n_devices),
+        "time_zone_id": "Europe/Paris",
+    })
+    return df[list(FLEET_COLUMNS)]
+
+
+def objectives_and_production(ids, rng, n_mppt=2):
+    battery = np.repeat(ids, n_mppt * 12)
+    mppt = np.tile(np.repeat(np.arange(1, n_mppt + 1), 12), len(ids))
+    month = np.tile(np.arange(1, 13), len(ids) * n_mppt)
+    seasonal = 1 + 0.6 * np.sin((month - 3) / 12 * 2 * np.pi)
+    objectives = pd.DataFrame({
+        "battery_id": battery, "mppt_id": mppt, "month": month,
+        "value": (200_000 * seasonal * rng.uniform(0.7, 1.3, len(battery))).astype(np.int64),
+    })
+    # 18 mois de production : certains mois sont présents sur deux années
+    dates = pd.date_range("2023-11-01", periods=18, freq="MS", tz="UTC")
+    n = len(ids) * n_mppt * len(dates)
+    production = pd.DataFrame({
+        "battery_id": np.repeat(ids, n_mppt * len(dates)),
+        "mppt_id": np.tile(np.repeat(np.arange(1, n_mppt + 1), len(dates)), len(ids)),
+        "date": np.tile(dates, len(ids) * n_mppt),
+        "watt_hours": 180_000 * rng.uniform(0.3, 1.4, n),
+    })
+    return objectives, production
+
+
+def device_logs(ids, rng, start, days, per_device=20):
+    counts = rng.poisson(per_device, len(ids))
+    n = int(counts.sum())
+    return pd.DataFrame({
+        "battery_id": np.repeat(ids, counts),
+        "date": pd.Timestamp(start, tz="UTC") - pd.Timedelta(days=365)
+        + pd.to_timedelta(rng.integers(0, (365 + days) * 86400, n), unit="s"),
+        "type": rng.choice(["fault", "warning"], n, p=[0.3, 0.7]),
+        "message": rng.choice(LOG_MESSAGES, n),
+        "cleared": rng.random(n) < 0.8,
+        "cleared_at": pd.NaT,
+        "cleared_by": None,
+    })
+
+
+def measures(table_name, ids, rng, start, days, step_minutes):
+    dates = pd.date_range(start, periods=days * 24 * 60 // step_minutes, freq=f"{step_minutes}min", tz="UTC")
+    hours = dates.hour.to_numpy() + dates.minute.to_numpy() / 60
+    solar = np.clip(np.sin((hours - 6) / 14 * np.pi), 0, None)
+    profile = {
+        "battery_active_energy_measure": 150 + 120 * np.cos((hours - 19) / 24 * 2 * np.pi),
+        "battery_active_returned_energy_meter_measure": 200 * solar,
+        "battery_active_returned_energy_measure": 400 * solar,
+        "battery_energy_charged_measure": 250 * solar,
+        "battery_energy_discharged_measure": 120 * (hours >= 18),
+    }[table_name]
+    sub_ids = [1, 2] if table_name == "battery_active_returned_energy_measure" else [None]
+    frames = []
+    for sub_id in sub_ids:
+        n = len(ids) * len(dates)
+        frame = pd.DataFrame({
+            "device_id": np.repeat(ids, len(dates)),
+            "date": np.tile(dates, len(ids)),
+            "value": np.tile(profile / len(sub_ids), len(ids)) * rng.uniform(0.6, 1.4, n),
+        })
+        if sub_id is not None:
+            frame.insert(1, "device_sub_id", sub_id)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True).sort_values(["device_id", "date"], ignore_index=True)
+
+
+def generate(out, n_devices=1000, measure_devices=100, days=30, step_minutes=15,
+             start="2025-04-01", seed=0):
+    """Écrit un snapshot synthétique complet dans ``out`` ; renvoie le nombre de lignes par table."""
+    rng = np.random.default_rng(seed)
+    snapshot = SnapshotSource(out)
+    pools = value_pools()
+
+    fleet = fleet_inventory(n_devices, rng, pools)
+    ids = fleet["device_id"].to_numpy()
+    objectives, production = objectives_and_production(ids, rng)
+    tables = {
+        "fleet_inventory": fleet,
+        "objective_battery": objectives,
+        "monthly_production_battery": production,
+        "battery_device_log": device_logs(ids, rng, start, days),
+    }
+    measured_ids = ids[:measure_devices]
+    for table_name in MEASURE_TABLES:
+        tables[table_name] = measures(table_name, measured_ids, rng, start, days, step_minutes)
+
+    rows = {}
+    for table, df in tables.items():
+        snapshot.write(table, df)
+        rows[table] = len(df)
+    rows.update(materialize_snapshot(snapshot))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un snapshot de parc synthétique")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--measure-devices", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--step-minutes", type=int, default=15)
+    parser.add_argument("--start", default="2025-04-01")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = generate(args.out, args.devices, args.measure_devices, args.days,
+                    args.step_minutes, args.start, args.seed)
+    for table, n in rows.items():
+        print(f"✅ {table} : {n} lignes")
+
+
+if __name__ == "__main__":
+    main()
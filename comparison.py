@@ -0,0 +1,130 @@
+"""Comparaison de plusieurs batteries sur une même fenêtre.
+
+Chaque source est lue pour toutes les batteries en une requête
+(``device_id IN (...)``, agrégats ``rollups`` si la fenêtre est longue) : le
+nombre de requêtes ne dépend que du nombre de sources. Les séries sont
+ensuite alignées sur une grille de temps commune (somme par pas de grille)
+en un seul regroupement vectorisé : un DataFrame par source, une colonne par
+batterie.
+"""
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_source import get_data_source
+from downsampling import DEFAULT_MAX_POINTS
+from instrumentation import traced_cache
+from measures import fetch_concurrently, sources
+from rollups import RAW, STEPS, choose_resolution, load_rollup_many
+
+MAX_DEVICES = 20
+NORMALIZATIONS = ("absolute", "max")
+
+# Pas de grille possibles, du plus fin au plus grossier
+GRID_STEPS = [
+    pd.Timedelta(minutes=15), pd.Timedelta(minutes=30), pd.Timedelta(hours=1), pd.Timedelta(hours=3),
+    pd.Timedelta(hours=6), pd.Timedelta(hours=12), pd.Timedelta(days=1), pd.Timedelta(days=7),
+]
+
+
+def grid_step(start, end, max_points=DEFAULT_MAX_POINTS, resolution=RAW):
+    """Plus petit pas de grille donnant au plus ``max_points`` points (et pas plus fin que les données)."""
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    floor = STEPS.get(resolution, GRID_STEPS[0])
+    for step in GRID_STEPS:
+        if step >= floor and span / step <= max_points:
+            return step
+    return GRID_STEPS[-1]
+
+
+def step_label(step):
+    minutes = int(step.total_seconds() // 60)
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60} h" if minutes < 24 * 60 else f"{minutes // (24 * 60)} j"
+
+
+def normalize_many(table_name, df, resolution=RAW):
+    """Format long ``device_id, date, value`` trié ; somme MPPT pour les sources agrégées."""
+    if df.empty:
+        return pd.DataFrame({
+            "device_id": pd.Series(dtype="int64"),
+            "date": pd.Series(dtype="datetime64[ns, UTC]"),
+            "value": pd.Series(dtype=float),
+        })
+    value_column = "value" if resolution == RAW else "value_sum"
+    long = pd.DataFrame({
+        "device_id": df["device_id"].to_numpy(),
+        "date": df["date"].to_numpy(),
+        "value": df[value_column].to_numpy(dtype=float),
+    })
+    if resolution == RAW and sources[table_name]["agg"] and "device_sub_id" in df.columns:
+        long = long.groupby(["device_id", "date"], as_index=False)["value"].sum()
+    else:
+        # Doublons éventuels de synchronisation : on garde la dernière valeur
+        long = long.drop_duplicates(["device_id", "date"], keep="last")
+    return long.sort_values(["device_id", "date"], ignore_index=True)
+
+
+def _naive_utc(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp if timestamp.tz is None else timestamp.tz_convert("UTC").tz_localize(None)
+
+
+def align(long, device_ids, start, end, step):
+    """DataFrame grille x batteries : somme des valeurs par pas de grille (NaN sans mesure)."""
+    grid = pd.date_range(_naive_utc(start).floor(step), _naive_utc(end), freq=step)
+
+    dates = long["date"].dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+    # Position du pas de grille de chaque mesure, puis somme par (pas, batterie)
+    slot = (dates - grid[0].to_datetime64()) // step.to_timedelta64()
+    keep = (slot >= 0) & (slot < len(grid))
+    columns = pd.Index(device_ids, name="device_id")
+    device_pos = columns.get_indexer(long["device_id"].to_numpy())
+    keep &= device_pos >= 0
+
+    flat = slot[keep] * len(columns) + device_pos[keep]
+    values = long["value"].to_numpy()[keep]
+    size = len(grid) * len(columns)
+    # bincount renvoie des entiers quand aucune mesure n'est retenue
+    sums = np.bincount(flat, weights=values, minlength=size).astype(float, copy=False)
+    counts = np.bincount(flat, minlength=size)
+    sums[counts == 0] = np.nan
+    index = grid.tz_localize("UTC").rename("date")
+    return pd.DataFrame(sums.reshape(len(grid), len(columns)), index=index, columns=columns)
+
+
+def normalize_columns(wide, how="absolute"):
+    """``max`` : chaque batterie rapportée à son maximum sur la fenêtre (0 à 1)."""
+    if how == "absolute":
+        return wide
+    if how == "max":
+        return wide / wide.abs().max().replace(0, np.nan)
+    raise ValueError(f"Normalisation inconnue : {how}")
+
+
+@traced_cache(partial(st.cache_resource, max_entries=8))
+def load_comparison(device_ids, start_dt, end_dt, tables, max_points=DEFAULT_MAX_POINTS):
+    """{table: DataFrame grille x batteries}, une requête par source pour toutes les batteries.
+
+    Renvoie aussi la résolution lue et le pas de grille. Une source en échec
+    lève une erreur (rien n'est mis en cache).
+    """
+    device_ids = list(device_ids)
+    resolution = choose_resolution(start_dt, end_dt, max_points)
+    step = grid_step(start_dt, end_dt, max_points, resolution)
+    source = get_data_source()
+    if resolution == RAW:
+        loader = source.measures_many
+    else:
+        loader = partial(load_rollup_many, source, resolution)
+
+    aligned = {}
+    for table_name, df, error in fetch_concurrently(loader, tables, device_ids, start_dt, end_dt):
+        if error is not None:
+            raise RuntimeError(f"{sources[table_name]['title']} : {error}")
+        long = normalize_many(table_name, df, resolution)
+        aligned[table_name] = align(long, device_ids, start_dt, end_dt, step)
+    return {table_name: aligned[table_name] for table_name in tables}, resolution, step
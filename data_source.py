@@ -0,0 +1,722 @@
+"""Couche d'accès aux données partagée par toutes les pages.
+
+Deux backends exposent la même interface :
+
+- ``BigQuerySource`` : requêtes directes sur ``beem-data-warehouse`` ;
+- ``SnapshotSource`` : snapshot local au format Parquet (un fichier par table),
+  alimenté depuis les exports CSV ou synchronisé depuis BigQuery.
+
+Le backend est choisi par la variable d'environnement ``BEEM_DATA_SOURCE``
+(``bigquery`` par défaut, ou ``snapshot``) ; le dossier du snapshot par
+``BEEM_SNAPSHOT_DIR``. Devant BigQuery, les mesures passent par le cache disque
+partitionné par jour de ``measure_cache`` et toutes les requêtes (paramétrées,
+jamais construites par interpolation des valeurs) par le cache partagé entre
+process de ``query_cache``.
+
+Les deux backends lisent en Arrow (API BigQuery Storage si installée, Parquet
+pour le snapshot) et appliquent une seule fois le schéma déclaré de la table
+(``SCHEMAS`` : horodatages UTC, numériques, catégories) avant de passer en
+pandas sans copie des colonnes numériques : les loaders ne refont plus de
+``to_datetime`` / ``to_numeric`` / ``astype``.
+
+Alimentation du snapshot ::
+
+    python data_source.py seed-csv --csv-dir .
+    python data_source.py sync --start 2025-04-01 --end 2025-04-30
+"""
+import argparse
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from instrumentation import timed
+from measures import sources
+
+PROJECT = "beem-data-warehouse"
+DEFAULT_SNAPSHOT_DIR = Path(__file__).resolve().parent / "snapshot"
+
+# Tables de mesures autorisées (dataset mongo_beem)
+MEASURE_TABLES = (
+    "battery_active_energy_measure",
+    "battery_active_returned_energy_meter_measure",
+    "battery_active_returned_energy_measure",
+    "battery_energy_charged_measure",
+    "battery_energy_discharged_measure",
+)
+
+# Agrégats des tables de mesures (voir rollups.py), du plus fin au plus grossier
+ROLLUP_DATASET = "beem_rollups"
+ROLLUP_RESOLUTIONS = ("15min", "1h", "1D")
+ROLLUP_COLUMNS = ["device_id", "date", "value_sum", "value_min", "value_max", "value_count"]
+
+# Catalogue des colonnes de l'inventaire : nom exposé -> expression SQL.
+# Les pages ne lisent jamais "SELECT *" (métadonnées airbyte, colonnes dupliquées).
+FLEET_COLUMNS = {
+    "device_id": "d.id",
+    "serial_number": "d.serial_number",
+    "hardware_version": "d.hardware_version",
+    "created_at": "d.created_at",
+    "warranty_status": "d.warranty_status",
+    "reversed_ct": "d.reversed_ct",
+    "firmware_version": "d.firmware_version",
+    "firmware_versions": "d.firmware_versions",
+    "component_serial_numbers": "d.component_serial_numbers",
+    "soc": "ld.soc",
+    "capacity": "ld.capacity",
+    "nb_cycles": "ld.nb_cycles",
+    "global_soh": "ld.global_soh",
+    "nb_modules": "ld.nb_modules",
+    "working_mode_code": "ld.working_mode_code",
+    "last_known_measure_date": "ld.last_known_measure_date",
+    "_airbyte_extracted_at": "ld._airbyte_extracted_at",
+    "user_id": "u.id",
+    "lastname": "u.lastname",
+    "firstname": "u.firstname",
+    "email": "u.email",
+    "city": "h.city",
+    "zipcode": "h.zipcode",
+    "latitude": "h.latitude",
+    "longitude": "h.longitude",
+    "time_zone_id": "h.time_zone_id",
+}
+
+FLEET_QUERY = """
+        WITH device_user_data AS (
+     SELECT
+        {inner_columns}
+      FROM `beem-data-warehouse.airbyte_postgresql.battery_device` AS d
+      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.battery_live_data` AS ld ON ld.battery_id = d.id
+      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.house_user` AS hu ON d.house_id = hu.house_id
+      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.user` AS u ON hu.user_id = u.id
+      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.house` AS h ON h.id = hu.house_id
+      WHERE d.deleted_at IS NULL
+        AND d.replaced_by_id IS NULL
+        AND d.warranty_status = 'activated'
+        AND d.serial_number NOT IN ('021LOLL190154M','021LOLF080008M')
+        --AND u.id NOT IN (22, 4395, 34538)
+        --AND d.hardware_version = 'ampace_v1'
+    ),
+
+    serial_counts AS (
+      SELECT
+        serial_number,
+        COUNT(*) AS nb
+      FROM device_user_data
+      GROUP BY serial_number
+    ),
+    final AS (
+      SELECT {final_columns}
+      FROM device_user_data dud
+      JOIN serial_counts sc ON dud.serial_number = sc.serial_number
+      WHERE
+        -- si le serial est unique, on garde tout
+        sc.nb = 1
+
+        -- si le serial est dupliqué, on garde seulement si email ne se termine pas par @beemenergy
+        OR (
+        sc.nb > 1
+       AND dud.email NOT LIKE '%@beemenergy.com'
+        AND dud.email NOT LIKE '%@beemenergy.fr'
+      )
+    )
+    SELECT * FROM final;
+    """
+
+
+def fleet_query(columns):
+    # serial_number et email sont nécessaires au dédoublonnage
+    inner = list(dict.fromkeys([*columns, "serial_number", "email"]))
+    return FLEET_QUERY.format(
+        inner_columns=",\n        ".join(f"{FLEET_COLUMNS[c]} AS {c}" for c in inner),
+        final_columns=", ".join(f"dud.{c}" for c in columns),
+    )
+
+
+# Nom de la table du snapshot -> export CSV qui l'alimente
+CSV_EXPORTS = {
+    "fleet_inventory": "battery_actives_infos.csv",
+    "objective_battery": "objective_battery.csv",
+    "monthly_production_battery": "monthly_production_battery.csv",
+}
+
+# Colonnes horodatées des exports ("2025-04-30 02:24:45.655000 UTC")
+CSV_DATE_COLUMNS = (
+    "date", "created_at", "updated_at", "last_known_measure_date",
+    "_airbyte_extracted_at", "_airbyte_extracted_at_1", "_airbyte_extracted_at_2",
+)
+
+
+# ========== 🧱 Schémas Arrow ==========
+# Types appliqués à l'ingestion ; les colonnes hors schéma sont gardées telles quelles
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+FLEET_SCHEMA = pa.schema([
+    ("device_id", pa.int64()),
+    ("serial_number", pa.string()),
+    ("hardware_version", CATEGORY),
+    ("created_at", TIMESTAMP),
+    ("warranty_status", CATEGORY),
+    ("reversed_ct", pa.bool_()),
+    ("firmware_version", CATEGORY),
+    ("firmware_versions", pa.string()),
+    ("component_serial_numbers", pa.string()),
+    ("soc", pa.int64()),
+    ("capacity", pa.float64()),
+    ("nb_cycles", pa.int64()),
+    ("global_soh", pa.float64()),
+    ("nb_modules", pa.int64()),
+    ("working_mode_code", CATEGORY),
+    ("last_known_measure_date", TIMESTAMP),
+    ("_airbyte_extracted_at", TIMESTAMP),
+    ("user_id", pa.int64()),
+    ("lastname", pa.string()),
+    ("firstname", pa.string()),
+    ("email", pa.string()),
+    ("city", CATEGORY),
+    ("zipcode", pa.string()),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("time_zone_id", CATEGORY),
+])
+MEASURE_SCHEMA = pa.schema([
+    ("device_id", pa.int64()),
+    ("device_sub_id", pa.int64()),
+    ("date", TIMESTAMP),
+    ("value", pa.float64()),
+])
+ROLLUP_SCHEMA = pa.schema([
+    ("device_id", pa.int64()),
+    ("date", TIMESTAMP),
+    ("value_sum", pa.float64()),
+    ("value_min", pa.float64()),
+    ("value_max", pa.float64()),
+    ("value_count", pa.int64()),
+])
+SCHEMAS = {
+    "fleet_inventory": FLEET_SCHEMA,
+    "objective_battery": pa.schema([
+        ("battery_id", pa.int64()),
+        ("mppt_id", pa.int64()),
+        ("month", pa.int64()),
+        ("value", pa.float64()),
+    ]),
+    "monthly_production_battery": pa.schema([
+        ("battery_id", pa.int64()),
+        ("mppt_id", pa.int64()),
+        ("date", TIMESTAMP),
+        ("watt_hours", pa.float64()),
+    ]),
+    "battery_device_log": pa.schema([
+        ("battery_id", pa.int64()),
+        ("date", TIMESTAMP),
+        ("type", CATEGORY),
+        ("message", CATEGORY),
+        ("cleared", pa.bool_()),
+        ("cleared_at", TIMESTAMP),
+        ("cleared_by", pa.string()),
+    ]),
+    **{table: MEASURE_SCHEMA for table in MEASURE_TABLES},
+}
+
+
+def conform(table, schema):
+    """Convertit côté Arrow les colonnes de ``table`` présentes dans ``schema``."""
+    if schema is None:
+        return table
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if isinstance(column.type, pa.ExtensionType):
+            # JSON BigQuery et autres types étendus : on repart du stockage
+            column = pa.chunked_array([chunk.storage for chunk in column.chunks], column.type.storage_type)
+        if name in schema.names and not column.type.equals(schema.field(name).type):
+            target = schema.field(name).type
+            # Horodatages : ns -> us et naïf -> UTC sans contrôle de précision
+            column = column.cast(target, safe=not pa.types.is_timestamp(target))
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+def utc_timestamp(value):
+    """Borne de requête en ``Timestamp`` UTC (naïve = déjà en UTC)."""
+    value = pd.Timestamp(value)
+    return value.tz_localize("UTC") if value.tz is None else value.tz_convert("UTC")
+
+
+def to_pandas(table):
+    """DataFrame sans copie des colonnes numériques sans manquants ; ``table`` est libérée."""
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _fleet_columns(columns):
+    columns = list(columns or FLEET_COLUMNS)
+    unknown = set(columns) - set(FLEET_COLUMNS)
+    if unknown:
+        raise ValueError(f"Colonnes d'inventaire inconnues : {sorted(unknown)}")
+    return columns
+
+
+def rollup_table(table_name, resolution):
+    return f"rollup_{table_name}_{resolution}"
+
+
+def daily_table(table_name):
+    """Nom de requête des sommes journalières (``daily_many``) d'une table de mesures."""
+    return f"daily_{table_name}"
+
+
+SCHEMAS.update({
+    rollup_table(table, resolution): ROLLUP_SCHEMA
+    for table in MEASURE_TABLES for resolution in ROLLUP_RESOLUTIONS
+})
+SCHEMAS.update({daily_table(table): ROLLUP_SCHEMA for table in MEASURE_TABLES})
+
+
+def _check_rollup(table_name, resolution):
+    _check_measure_table(table_name)
+    if resolution not in ROLLUP_RESOLUTIONS:
+        raise ValueError(f"Résolution d'agrégat inconnue : {resolution}")
+
+
+def _window_params(start_dt, end_dt):
+    """Paramètres ``@start_dt`` / ``@end_dt`` (DATETIME naïfs en UTC)."""
+    return [
+        ("start_dt", "DATETIME", pd.Timestamp(start_dt).to_pydatetime()),
+        ("end_dt", "DATETIME", pd.Timestamp(end_dt).to_pydatetime()),
+    ]
+
+
+def _device_filter(device_ids):
+    """Condition sur ``device_id`` et ses paramètres ; tout le parc si ``device_ids`` est None."""
+    if device_ids is None:
+        return "TRUE", []
+    return "device_id IN UNNEST(@device_ids)", [("device_ids", "INT64", [int(d) for d in device_ids])]
+
+
+def _query_parameters(params):
+    """(nom, type, valeur) -> paramètres BigQuery ; une liste donne un ARRAY."""
+    from google.cloud import bigquery
+
+    return [
+        bigquery.ArrayQueryParameter(name, type_, value) if isinstance(value, list)
+        else bigquery.ScalarQueryParameter(name, type_, value)
+        for name, type_, value in params
+    ]
+
+
+def _check_measure_table(table_name):
+    if table_name not in MEASURE_TABLES:
+        raise ValueError(f"Table de mesures inconnue : {table_name}")
+
+
+class DataSource:
+    """Interface commune des backends de données."""
+
+    name = "base"
+
+    def fleet_inventory(self, columns=None):
+        raise NotImplementedError
+
+    def fleet_watermark(self):
+        """Filigrane de synchronisation : (max last_known_measure_date, max _airbyte_extracted_at)."""
+        raise NotImplementedError
+
+    def objectives(self, battery_id=None):
+        """Objectifs mensuels d'une batterie, ou de tout le parc si ``battery_id`` est None."""
+        raise NotImplementedError
+
+    def monthly_production(self, battery_id=None):
+        """Production mensuelle d'une batterie, ou de tout le parc si ``battery_id`` est None."""
+        raise NotImplementedError
+
+    def measures(self, table_name, device_id, start_dt, end_dt):
+        raise NotImplementedError
+
+    def rollup(self, table_name, resolution, device_id, start_dt, end_dt):
+        """Agrégats (``ROLLUP_COLUMNS``) des intervalles commençant dans la fenêtre."""
+        raise NotImplementedError
+
+    def measures_many(self, table_name, device_ids, start_dt, end_dt):
+        """``measures`` pour plusieurs batteries en une requête (``None`` : tout le parc)."""
+        raise NotImplementedError
+
+    def rollup_many(self, table_name, resolution, device_ids, start_dt, end_dt):
+        """``rollup`` pour plusieurs batteries en une requête (``None`` : tout le parc)."""
+        raise NotImplementedError
+
+    def daily_many(self, table_name, device_ids, start_dt, end_dt):
+        """Agrégats journaliers (``ROLLUP_COLUMNS``, jours UTC) des mesures brutes, calculés par le backend.
+
+        Une ligne par (batterie, jour) ; somme MPPT par horodatage d'abord pour
+        les sources agrégées, comme ``rollups.build_rollup``.
+        """
+        raise NotImplementedError
+
+    def rollup_watermark(self, table_name, resolution):
+        """Début du dernier intervalle de l'agrégat (ceux d'avant sont complets), None s'il est absent."""
+        raise NotImplementedError
+
+    def logs(self, battery_id=None, types=("fault", "warning")):
+        """Logs d'une batterie, ou de tout le parc si ``battery_id`` est None."""
+        raise NotImplementedError
+
+
+class BigQuerySource(DataSource):
+    name = "bigquery"
+
+    def __init__(self, project=PROJECT, cache=None):
+        from google.cloud import bigquery
+
+        self.project = project
+        self.client = bigquery.Client()
+        # ``query_cache.QueryCache`` partagé entre process, ou None
+        self.cache = cache
+        try:
+            from google.cloud import bigquery_storage  # noqa: F401
+
+            self.storage_api = True
+        except ImportError:
+            self.storage_api = False
+
+    def _query(self, query, name="query", params=()):
+        if self.cache is None:
+            return to_pandas(self._run(query, name, params))
+        return to_pandas(self.cache.fetch(name, query, params, lambda: self._run(query, name, params)))
+
+    def _run(self, query, name, params):
+        """Table Arrow du résultat, schéma de la table ``name`` appliqué."""
+        from google.cloud import bigquery
+
+        config = bigquery.QueryJobConfig(query_parameters=_query_parameters(params))
+        with timed("query", name) as fields:
+            job = self.client.query(query, job_config=config)
+            table = conform(job.to_arrow(create_bqstorage_client=self.storage_api), SCHEMAS.get(name))
+            fields.update(
+                rows=table.num_rows,
+                bytes_processed=job.total_bytes_processed,
+                bytes_billed=job.total_bytes_billed,
+                bq_cache_hit=job.cache_hit,
+                storage_api=self.storage_api,
+            )
+        return table
+
+    def fleet_inventory(self, columns=None):
+        return self._query(fleet_query(_fleet_columns(columns)), "fleet_inventory")
+
+    def fleet_watermark(self):
+        row = self._query(f"""
+            SELECT MAX(last_known_measure_date) AS last_known_measure_date,
+                   MAX(_airbyte_extracted_at) AS _airbyte_extracted_at
+            FROM `{self.project}.airbyte_postgresql.battery_live_data`
+        """, "fleet_watermark").iloc[0]
+        watermark = row["last_known_measure_date"], row["_airbyte_extracted_at"]
+        if self.cache is not None:
+            # Nouvelle synchro : l'inventaire en cache (tous réplicas) est périmé
+            self.cache.sync_token("fleet", watermark)
+        return watermark
+
+    def objectives(self, battery_id=None):
+        if battery_id is None:
+            where, params = "", []
+        else:
+            where, params = "WHERE battery_id = @battery_id", [("battery_id", "INT64", int(battery_id))]
+        return self._query(f"""
+            SELECT battery_id, mppt_id, month, value
+            FROM `{self.project}.airbyte_postgresql.objective_battery`
+            {where}
+        """, "objective_battery", params)
+
+    def monthly_production(self, battery_id=None):
+        if battery_id is None:
+            where, params = "", []
+        else:
+            where, params = "WHERE battery_id = @battery_id", [("battery_id", "INT64", int(battery_id))]
+        return self._query(f"""
+            SELECT battery_id, mppt_id, date, watt_hours
+            FROM `{self.project}.airbyte_postgresql.monthly_production_battery`
+            {where}
+        """, "monthly_production_battery", params)
+
+    def measures(self, table_name, device_id, start_dt, end_dt):
+        _check_measure_table(table_name)
+        return self._query(f"""
+            SELECT *
+            FROM `{self.project}.mongo_beem.{table_name}`
+            WHERE device_id = @device_id
+              AND DATETIME(date) BETWEEN @start_dt AND @end_dt
+        """, table_name, [("device_id", "INT64", int(device_id)), *_window_params(start_dt, end_dt)])
+
+    def rollup(self, table_name, resolution, device_id, start_dt, end_dt):
+        _check_rollup(table_name, resolution)
+        return self._query(f"""
+            SELECT {", ".join(ROLLUP_COLUMNS)}
+            FROM `{self.project}.{ROLLUP_DATASET}.{rollup_table(table_name, resolution)}`
+            WHERE device_id = @device_id
+              AND DATETIME(date) BETWEEN @start_dt AND @end_dt
+        """, rollup_table(table_name, resolution),
+            [("device_id", "INT64", int(device_id)), *_window_params(start_dt, end_dt)])
+
+    def measures_many(self, table_name, device_ids, start_dt, end_dt):
+        _check_measure_table(table_name)
+        device_filter, params = _device_filter(device_ids)
+        return self._query(f"""
+            SELECT *
+            FROM `{self.project}.mongo_beem.{table_name}`
+            WHERE {device_filter}
+              AND DATETIME(date) BETWEEN @start_dt AND @end_dt
+        """, table_name, [*params, *_window_params(start_dt, end_dt)])
+
+    def rollup_many(self, table_name, resolution, device_ids, start_dt, end_dt):
+        _check_rollup(table_name, resolution)
+        device_filter, params = _device_filter(device_ids)
+        return self._query(f"""
+            SELECT {", ".join(ROLLUP_COLUMNS)}
+            FROM `{self.project}.{ROLLUP_DATASET}.{rollup_table(table_name, resolution)}`
+            WHERE {device_filter}
+              AND DATETIME(date) BETWEEN @start_dt AND @end_dt
+        """, rollup_table(table_name, resolution), [*params, *_window_params(start_dt, end_dt)])
+
+    def daily_many(self, table_name, device_ids, start_dt, end_dt):
+        _check_measure_table(table_name)
+        device_filter, params = _device_filter(device_ids)
+        if sources[table_name]["agg"]:
+            base = "SELECT device_id, TIMESTAMP(date) AS date, SUM(value) AS value"
+            group = "GROUP BY 1, 2"
+        else:
+            base, group = "SELECT device_id, TIMESTAMP(date) AS date, value", ""
+        return self._query(f"""
+            WITH base AS (
+              {base}
+              FROM `{self.project}.mongo_beem.{table_name}`
+              WHERE {device_filter}
+                AND DATETIME(date) BETWEEN @start_dt AND @end_dt
+              {group}
+            )
+            SELECT device_id, TIMESTAMP(DATE(date)) AS date,
+                   SUM(value) AS value_sum, MIN(value) AS value_min,
+                   MAX(value) AS value_max, COUNT(value) AS value_count
+            FROM base
+            GROUP BY 1, 2
+        """, daily_table(table_name), [*params, *_window_params(start_dt, end_dt)])
+
+    def rollup_watermark(self, table_name, resolution):
+        from google.api_core.exceptions import NotFound
+
+        _check_rollup(table_name, resolution)
+        try:
+            watermark = self._query(f"""
+                SELECT MAX(date) AS date
+                FROM `{self.project}.{ROLLUP_DATASET}.{rollup_table(table_name, resolution)}`
+            """, "rollup_watermark")["date"].iloc[0]
+        except NotFound:
+            return None
+        return None if pd.isna(watermark) else watermark
+
+    def logs(self, battery_id=None, types=("fault", "warning")):
+        params = [("types", "STRING", [str(t) for t in types])]
+        device_filter = ""
+        if battery_id is not None:
+            device_filter = "AND battery_id = @battery_id"
+            params.append(("battery_id", "INT64", int(battery_id)))
+        return self._query(f"""
+            SELECT battery_id, date, type, message, cleared, cleared_at, cleared_by
+            FROM `{self.project}.airbyte_postgresql.battery_device_log`
+            WHERE type IN UNNEST(@types)
+              {device_filter}
+        """, "battery_device_log", params)
+
+
+class SnapshotSource(DataSource):
+    """Snapshot local : un fichier ``<table>.parquet`` par table."""
+
+    name = "snapshot"
+
+    def __init__(self, root=None):
+        self.root = Path(root or os.environ.get("BEEM_SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR))
+
+    def path(self, table):
+        return self.root / f"{table}.parquet"
+
+    def _read(self, table, filters=None, columns=None):
+        path = self.path(table)
+        if not path.exists():
+            # seed-csv n'écrit ni les logs ni les mesures : table typée vide
+            if table in SCHEMAS:
+                schema = SCHEMAS[table]
+                return to_pandas(schema.empty_table().select(columns or schema.names))
+            raise FileNotFoundError(
+                f"Table absente du snapshot : {path} (lancer `python data_source.py sync`)"
+            )
+        with timed("query", table) as fields:
+            arrow_table = conform(pq.read_table(path, columns=columns, filters=filters), SCHEMAS.get(table))
+            fields.update(rows=arrow_table.num_rows, bytes_processed=path.stat().st_size)
+        return to_pandas(arrow_table)
+
+    def fleet_inventory(self, columns=None):
+        return self._read("fleet_inventory", columns=_fleet_columns(columns))
+
+    def fleet_watermark(self):
+        df = self._read("fleet_inventory", columns=["last_known_measure_date", "_airbyte_extracted_at"])
+        return df["last_known_measure_date"].max(), df["_airbyte_extracted_at"].max()
+
+    def objectives(self, battery_id=None):
+        filters = None if battery_id is None else [("battery_id", "==", battery_id)]
+        return self._read(
+            "objective_battery", filters=filters,
+            columns=["battery_id", "mppt_id", "month", "value"],
+        )
+
+    def monthly_production(self, battery_id=None):
+        filters = None if battery_id is None else [("battery_id", "==", battery_id)]
+        return self._read(
+            "monthly_production_battery", filters=filters,
+            columns=["battery_id", "mppt_id", "date", "watt_hours"],
+        )
+
+    def measures(self, table_name, device_id, start_dt, end_dt):
+        _check_measure_table(table_name)
+        df = self._read(table_name, filters=[("device_id", "==", device_id)])
+        return self._between(df, start_dt, end_dt)
+
+    def rollup(self, table_name, resolution, device_id, start_dt, end_dt):
+        return self.rollup_many(table_name, resolution, [device_id], start_dt, end_dt)
+
+    def measures_many(self, table_name, device_ids, start_dt, end_dt):
+        _check_measure_table(table_name)
+        df = self._read(table_name, filters=self._device_filters(device_ids))
+        return self._between(df, start_dt, end_dt)
+
+    def rollup_many(self, table_name, resolution, device_ids, start_dt, end_dt):
+        _check_rollup(table_name, resolution)
+        df = self._read(
+            rollup_table(table_name, resolution), filters=self._device_filters(device_ids),
+            columns=ROLLUP_COLUMNS,
+        )
+        return self._between(df, start_dt, end_dt)
+
+    def daily_many(self, table_name, device_ids, start_dt, end_dt):
+        from rollups import build_rollup
+
+        return build_rollup(self.measures_many(table_name, device_ids, start_dt, end_dt), table_name, "1D")
+
+    def rollup_watermark(self, table_name, resolution):
+        _check_rollup(table_name, resolution)
+        table = rollup_table(table_name, resolution)
+        if not self.path(table).exists():
+            return None
+        watermark = self._read(table, columns=["date"])["date"].max()
+        return None if pd.isna(watermark) else watermark
+
+    @staticmethod
+    def _device_filters(device_ids):
+        return None if device_ids is None else [("device_id", "in", list(device_ids))]
+
+    @staticmethod
+    def _between(df, start_dt, end_dt):
+        # Même sémantique que DATETIME(date) BETWEEN ... : bornes UTC
+        mask = df["date"].between(utc_timestamp(start_dt), utc_timestamp(end_dt))
+        return df[mask].reset_index(drop=True)
+
+    def logs(self, battery_id=None, types=("fault", "warning")):
+        filters = [("type", "in", list(types))]
+        if battery_id is not None:
+            filters.append(("battery_id", "==", battery_id))
+        df = self._read("battery_device_log", filters=filters)
+        return df[["battery_id", "date", "type", "message", "cleared", "cleared_at", "cleared_by"]]
+
+    def write(self, table, df):
+        self.root.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(self.path(table), index=False)
+
+
+@lru_cache(maxsize=None)
+def get_data_source(kind=None):
+    """Backend partagé par le process (``BEEM_DATA_SOURCE`` si ``kind`` absent)."""
+    kind = kind or os.environ.get("BEEM_DATA_SOURCE", "bigquery")
+    if kind == "bigquery":
+        cache = None
+        if os.environ.get("BEEM_QUERY_CACHE", "1") != "0":
+            from query_cache import QueryCache
+
+            cache = QueryCache()
+        source = BigQuerySource(cache=cache)
+        if os.environ.get("BEEM_MEASURE_CACHE", "1") != "0":
+            from measure_cache import CachedMeasuresSource
+
+            return CachedMeasuresSource(source)
+        return source
+    if kind == "snapshot":
+        return SnapshotSource()
+    raise ValueError(f"Backend de données inconnu : {kind}")
+
+
+# ========== 💾 Alimentation du snapshot ==========
+
+def seed_snapshot_from_csv(csv_dir, snapshot=None):
+    snapshot = snapshot or SnapshotSource()
+    csv_dir = Path(csv_dir)
+    for table, filename in CSV_EXPORTS.items():
+        path = csv_dir / filename
+        if not path.exists():
+            print(f"⏭️  {filename} absent, ignoré")
+            continue
+        df = pd.read_csv(path)
+        for col in CSV_DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], utc=True, errors="coerce")
+        snapshot.write(table, df)
+        print(f"✅ {table} : {len(df)} lignes")
+
+
+def sync_snapshot_from_bigquery(start_dt, end_dt, snapshot=None, source=None):
+    snapshot = snapshot or SnapshotSource()
+    # Lecture directe de l'entrepôt, sans les caches
+    source = source or BigQuerySource()
+    project = source.project
+
+    snapshot.write("fleet_inventory", source.fleet_inventory())
+    for table in ("objective_battery", "monthly_production_battery"):
+        snapshot.write(table, source._query(f"SELECT * FROM `{project}.airbyte_postgresql.{table}`"))
+    snapshot.write("battery_device_log", source.logs())
+    for table in MEASURE_TABLES:
+        snapshot.write(table, source._query(f"""
+            SELECT *
+            FROM `{project}.mongo_beem.{table}`
+            WHERE DATETIME(date) BETWEEN @start_dt AND @end_dt
+            ORDER BY device_id, date
+        """, params=_window_params(start_dt, end_dt)))
+        print(f"✅ {table}")
+
+    # Mesures remplacées : agrégats reconstruits sur la nouvelle fenêtre
+    from rollups import materialize_snapshot
+
+    for table, n in materialize_snapshot(snapshot).items():
+        print(f"✅ {table} : {n} lignes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alimentation du snapshot local")
+    parser.add_argument("--snapshot-dir", default=None)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    seed = sub.add_parser("seed-csv", help="Snapshot depuis les exports CSV")
+    seed.add_argument("--csv-dir", default=".")
+
+    sync = sub.add_parser("sync", help="Snapshot depuis BigQuery")
+    sync.add_argument("--start", required=True)
+    sync.add_argument("--end", required=True)
+
+    args = parser.parse_args()
+    snapshot = SnapshotSource(args.snapshot_dir)
+    if args.command == "seed-csv":
+        seed_snapshot_from_csv(args.csv_dir, snapshot)
+    else:
+        sync_snapshot_from_bigquery(args.start, args.end, snapshot)
+
+
+if __name__ == "__main__":
+    main()
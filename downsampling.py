@@ -0,0 +1,105 @@
+"""Réduction du nombre de points envoyés au navigateur pour les courbes.
+
+Deux méthodes, toutes deux renvoyant les indices des points conservés :
+
+- ``minmax`` : découpe l'axe du temps en ``max_points // 2`` intervalles
+  (≈ un par pixel) et garde le minimum et le maximum de chacun. Les pics sont
+  conservés exactement, ce qui compte pour l'analyse des défauts ;
+- ``lttb`` : Largest-Triangle-Three-Buckets, plus fidèle visuellement pour les
+  courbes lisses.
+"""
+import numpy as np
+import pandas as pd
+
+METHODS = ("minmax", "lttb")
+DEFAULT_MAX_POINTS = 2000
+
+
+def _as_float(x):
+    if isinstance(x.dtype, pd.DatetimeTZDtype):
+        x = x.tz_localize(None) if isinstance(x, pd.Index) else x.dt.tz_localize(None)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def minmax_indices(x, y, max_points):
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return np.arange(n)
+
+    n_buckets = max_points // 2
+    span = x[-1] - x[0]
+    if span <= 0:
+        bucket = np.arange(n) * n_buckets // n
+    else:
+        bucket = np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+
+    # Tri par (intervalle, valeur) : premier = min, dernier = max de chaque intervalle
+    order = np.lexsort((y, bucket))
+    b_sorted = bucket[order]
+    change = b_sorted[1:] != b_sorted[:-1]
+    first = np.r_[True, change]
+    last = np.r_[change, True]
+    return np.unique(np.r_[0, order[first], order[last], n - 1])
+
+
+def lttb_indices(x, y, max_points):
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Point moyen de l'intervalle suivant
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(data, max_points=DEFAULT_MAX_POINTS, method="minmax", x="date", y="value"):
+    """Sous-échantillonne à au plus ~``max_points`` points.
+
+    ``data`` est soit une série indexée par date, soit un DataFrame trié sur ``x``.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Méthode de sous-échantillonnage inconnue : {method}")
+    if isinstance(data, pd.Series):
+        data = data.dropna()
+        xs, ys = data.index, data.to_numpy()
+    else:
+        data = data[data[y].notna()]
+        xs, ys = data[x], data[y].to_numpy()
+    if len(data) <= max_points:
+        return data
+    indices = (minmax_indices if method == "minmax" else lttb_indices)(xs, ys, max_points)
+    return data.iloc[indices]
+
+
+def clip_window(data, start, end, x="date"):
+    """Restreint à la fenêtre [start, end] (bornes naïves interprétées en UTC).
+
+    Sur une série à index trié, la découpe se fait par recherche binaire.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    dates = data.index if isinstance(data, pd.Series) else data[x]
+    if isinstance(dates.dtype, pd.DatetimeTZDtype):
+        start, end = start.tz_localize("UTC"), end.tz_localize("UTC")
+    if isinstance(data, pd.Series):
+        return data.loc[start:end]
+    return data[data[x].between(start, end)]
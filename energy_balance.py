@@ -0,0 +1,149 @@
+"""Contrôle de cohérence du bilan énergétique, pour tout le parc à la fois.
+
+Les cinq sources de mesures sont lues pour tout le parc sur la période (une
+requête par source) puis rangées dans un tableau NumPy ``(source, jour,
+batterie)``. Les mesures brutes ne quittent jamais le backend : sans agrégats,
+chaque source est sommée par jour dans la requête (``daily_many``) ; avec
+``BEEM_ROLLUPS=1``, elle est lue dans les agrégats journaliers
+(``rollups.load_rollup_many``), la partie absente ou en retard étant elle
+aussi sommée par ``daily_many``.
+Les invariants sont vérifiés jour par jour, pour toutes les batteries en une
+opération :
+
+- bilan : consommation - (solaire + déstockage - stockage - ré-injection)
+  est l'import réseau implicite et ne peut pas être négatif ;
+- ré-injection : on ne ré-injecte pas plus que solaire + déstockage ;
+- compteurs : aucune énergie journalière négative.
+
+Une tolérance (``ABS_TOLERANCE_WH`` ou ``REL_TOLERANCE`` de l'énergie
+produite, la plus grande) absorbe les décalages d'horodatage entre compteurs.
+Les deux premiers ne portent que sur les jours complets (cinq sources
+présentes). Le score d'une batterie est la part de ses jours mesurés en
+défaut : CT inversé (``reversed_ct``) ou compteur cassé.
+
+    python energy_balance.py --start 2025-04-01 --end 2025-04-30T23:59:59 --out anomalies.csv
+"""
+import argparse
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from comparison import align, normalize_many
+from data_source import get_data_source
+from fleet import SCAN_COLUMNS, read_fleet
+from instrumentation import traced_cache
+from measures import fetch_concurrently
+from rollups import RAW, choose_resolution, load_rollup_many
+
+CONSUMPTION = "battery_active_energy_measure"
+EXPORT = "battery_active_returned_energy_meter_measure"
+SOLAR = "battery_active_returned_energy_measure"
+CHARGE = "battery_energy_charged_measure"
+DISCHARGE = "battery_energy_discharged_measure"
+BALANCE_TABLES = (CONSUMPTION, SOLAR, DISCHARGE, CHARGE, EXPORT)
+
+DAY = pd.Timedelta(days=1)
+ABS_TOLERANCE_WH = 500
+REL_TOLERANCE = 0.05
+
+ANOMALY_COLUMNS = [
+    "score", "days", "covered_days", "negative_balance_days", "export_excess_days",
+    "negative_value_days", "worst_gap_wh", "consumption_wh", "supplied_wh",
+]
+
+
+def load_daily(device_ids, start_dt, end_dt):
+    """Énergies journalières ``(source, jour, batterie)`` dans l'ordre de ``BALANCE_TABLES`` (NaN si absent)."""
+    # Agrégats journaliers si activés (complétés par les mesures brutes), sinon sommes
+    # journalières calculées par le backend : batteries x jours lignes par source
+    resolution = choose_resolution(start_dt, end_dt, min_points=1)
+    source = get_data_source()
+    if resolution == RAW:
+        loader, resolution = source.daily_many, "1D"
+    else:
+        loader = partial(load_rollup_many, source, resolution)
+
+    daily = {}
+    for table_name, df, error in fetch_concurrently(loader, BALANCE_TABLES, None, start_dt, end_dt):
+        if error is not None:
+            raise RuntimeError(f"{table_name} : {error}")
+        daily[table_name] = align(normalize_many(table_name, df, resolution), device_ids, start_dt, end_dt, DAY)
+    days = daily[CONSUMPTION].index
+    return days, np.stack([daily[table_name].to_numpy() for table_name in BALANCE_TABLES])
+
+
+def check_balance(daily, abs_tolerance=ABS_TOLERANCE_WH, rel_tolerance=REL_TOLERANCE):
+    """Indicateurs par batterie (colonnes ``ANOMALY_COLUMNS``) à partir de ``load_daily``."""
+    consumption, solar, discharge, charge, export = daily
+    produced = solar + discharge
+    supplied = produced - charge - export
+    # Import réseau implicite : négatif = énergie consommée manquante
+    gap = consumption - supplied
+    tolerance = np.maximum(abs_tolerance, rel_tolerance * np.abs(produced))
+
+    covered = ~np.isnan(daily).any(axis=0)
+    observed = ~np.isnan(daily).all(axis=0)
+    with np.errstate(invalid="ignore"):
+        negative_balance = covered & (gap < -tolerance)
+        export_excess = covered & (export > produced + tolerance)
+        negative_values = (daily < 0).any(axis=0)
+
+    covered_days = covered.sum(axis=0)
+    violations = (negative_balance | export_excess | negative_values).sum(axis=0)
+    return pd.DataFrame({
+        "score": violations / np.maximum(observed.sum(axis=0), 1),
+        "days": daily.shape[1],
+        "covered_days": covered_days,
+        "negative_balance_days": negative_balance.sum(axis=0),
+        "export_excess_days": export_excess.sum(axis=0),
+        "negative_value_days": negative_values.sum(axis=0),
+        # fmin ignore les NaN (jours incomplets) sans avertissement
+        "worst_gap_wh": np.fmin.reduce(np.where(covered, gap, np.nan), axis=0),
+        "consumption_wh": np.where(covered, consumption, 0).sum(axis=0),
+        "supplied_wh": np.where(covered, supplied, 0).sum(axis=0),
+    })
+
+
+def rank_anomalies(fleet, checks):
+    """Batteries triées par score puis par plus grand déficit ; identité de l'inventaire jointe."""
+    ranked = pd.concat([fleet[SCAN_COLUMNS].reset_index(drop=True), checks], axis=1)
+    return ranked.sort_values(["score", "worst_gap_wh"], ascending=[False, True], ignore_index=True)
+
+
+def scan_fleet(fleet, start_dt, end_dt, abs_tolerance=ABS_TOLERANCE_WH, rel_tolerance=REL_TOLERANCE):
+    """Tableau classé des anomalies pour les batteries de ``fleet`` (colonnes ``SCAN_COLUMNS``)."""
+    _, daily = load_daily(fleet["device_id"].to_numpy(), start_dt, end_dt)
+    return rank_anomalies(fleet, check_balance(daily, abs_tolerance, rel_tolerance))
+
+
+@traced_cache(partial(st.cache_resource, max_entries=4))
+def load_daily_balance(version, start_dt, end_dt, _device_ids):
+    """``load_daily`` en cache par (version de l'inventaire, période) ; les tolérances se changent sans relecture."""
+    return load_daily(_device_ids, start_dt, end_dt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contrôle du bilan énergétique du parc")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--out", default="anomalies.csv")
+    parser.add_argument("--abs-tolerance", type=float, default=ABS_TOLERANCE_WH)
+    parser.add_argument("--rel-tolerance", type=float, default=REL_TOLERANCE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    anomalies = scan_fleet(read_fleet(), args.start, args.end, args.abs_tolerance, args.rel_tolerance)
+    if args.out.endswith(".parquet"):
+        anomalies.to_parquet(args.out, index=False)
+    else:
+        anomalies.to_csv(args.out, index=False)
+    flagged = int((anomalies["score"] > 0).sum())
+    print(f"✅ {len(anomalies)} batteries contrôlées en {time.perf_counter() - started:.1f} s, "
+          f"{flagged} en anomalie -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Export des mesures brutes d'un ensemble de batteries, par morceaux.
+
+Les cinq sources du registre ``measures.sources`` sont lues par tranches de
+``CHUNK_DAYS`` jours et de ``DEVICE_BATCH`` batteries, une requête par source
+et par tranche (``measures_many``, les sources d'une tranche en parallèle),
+normalisées comme dans la page zoom (somme MPPT) puis écrites au fil de l'eau
+dans un fichier Parquet (un row group par source et tranche) ou CSV : seule
+une tranche est en mémoire à la fois. Format long : ``device_id, source, date, value``.
+
+    python export.py --devices 1 2 3 --start 2025-01-01 --end 2025-06-30T23:59:59 --out mesures.parquet
+"""
+import argparse
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from comparison import normalize_many
+from data_source import get_data_source
+from measures import fetch_concurrently, sources
+from rollups import RAW
+
+FORMATS = ("parquet", "csv")
+CHUNK_DAYS = 7
+DEVICE_BATCH = 50
+EXPORT_SCHEMA = pa.schema([
+    ("device_id", pa.int64()),
+    ("source", pa.string()),
+    ("date", pa.timestamp("ns", tz="UTC")),
+    ("value", pa.float64()),
+])
+
+
+def _windows(start_dt, end_dt, chunk_days):
+    """Tranches [début, fin] consécutives couvrant la période (bornes naïves UTC)."""
+    start, end = pd.Timestamp(start_dt), pd.Timestamp(end_dt)
+    step = pd.Timedelta(days=chunk_days)
+    while start <= end:
+        stop = min(start + step - pd.Timedelta(microseconds=1), end)
+        yield start.isoformat(), stop.isoformat()
+        start += step
+
+
+def _batches(device_ids, size):
+    for i in range(0, len(device_ids), size):
+        yield device_ids[i:i + size]
+
+
+def iter_measure_chunks(device_ids, start_dt, end_dt, tables=None, chunk_days=CHUNK_DAYS):
+    """DataFrames successifs (format long) par lot de batteries, tranche de temps et source."""
+    source = get_data_source()
+    tables = list(tables or sources)
+    for batch in _batches(list(device_ids), DEVICE_BATCH):
+        for window_start, window_end in _windows(start_dt, end_dt, chunk_days):
+            for table_name, df, error in fetch_concurrently(
+                source.measures_many, tables, batch, window_start, window_end
+            ):
+                if error is not None:
+                    raise RuntimeError(f"Export interrompu ({table_name}, devices {batch}) : {error}")
+                long = normalize_many(table_name, df, RAW)
+                if long.empty:
+                    continue
+                yield pd.DataFrame({
+                    "device_id": long["device_id"].to_numpy(),
+                    "source": table_name,
+                    "date": long["date"].to_numpy(),
+                    "value": long["value"].to_numpy(dtype=float),
+                })
+
+
+def write_chunks(chunks, path, fmt="parquet"):
+    """Écrit les morceaux dans ``path`` au fil de l'eau ; renvoie le nombre de lignes."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+    rows = 0
+    if fmt == "parquet":
+        with pq.ParquetWriter(path, EXPORT_SCHEMA, compression="zstd") as writer:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(chunk, schema=EXPORT_SCHEMA, preserve_index=False))
+                rows += len(chunk)
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(",".join(EXPORT_SCHEMA.names) + "\n")
+            for chunk in chunks:
+                chunk.to_csv(f, header=False, index=False)
+                rows += len(chunk)
+    return rows
+
+
+def export_measures(device_ids, start_dt, end_dt, path, fmt="parquet", tables=None,
+                    chunk_days=CHUNK_DAYS, progress=None):
+    """Exporte les mesures dans ``path``. ``progress(fraction)`` est appelé après chaque lot de batteries."""
+    device_ids = list(device_ids)
+
+    def tracked():
+        done = 0
+        for batch in _batches(device_ids, DEVICE_BATCH):
+            yield from iter_measure_chunks(batch, start_dt, end_dt, tables, chunk_days)
+            done += len(batch)
+            if progress is not None:
+                progress(done / len(device_ids))
+
+    return write_chunks(tracked(), path, fmt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export des mesures brutes de batteries")
+    parser.add_argument("--devices", type=int, nargs="+", required=True)
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--format", choices=FORMATS, default=None)
+    parser.add_argument("--table", action="append", choices=list(sources))
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if Path(args.out).suffix == ".csv" else "parquet")
+    rows = export_measures(args.devices, args.start, args.end, args.out, fmt, args.table, args.chunk_days)
+    print(f"✅ {rows} lignes exportées dans {args.out}")
+
+
+if __name__ == "__main__":
+    main()
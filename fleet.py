@@ -0,0 +1,267 @@
+"""Inventaire du parc partagé par toutes les pages.
+
+Chaque page déclare ici la projection de colonnes qu'elle consomme. La requête
+d'inventaire ne lit que l'union de ces projections, et une seule copie du
+résultat est conservée par process Streamlit (``st.cache_resource``).
+
+L'inventaire est rechargé en arrière-plan toutes les ``BEEM_FLEET_REFRESH_S``
+secondes (0 désactive) : les pages servent la version précédente jusqu'à ce
+que la nouvelle soit prête, et le rechargement est sauté tant que le filigrane
+de synchronisation (max ``last_known_measure_date`` / ``_airbyte_extracted_at``)
+n'a pas bougé.
+
+Le frame est compacté au chargement : catégories pour les colonnes à faible
+cardinalité, entiers réduits, et colonnes JSON gardées brutes puis décodées à
+la demande (``json_value``).
+"""
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_source import get_data_source
+from instrumentation import traced_cache
+
+# Projections par page
+APP_COLUMNS = [
+    "device_id", "lastname", "city", "latitude", "longitude", "hardware_version",
+    "clean_mode", "nb_cycles",
+]
+KPI_COLUMNS = ["hardware_version", "global_soh", "nb_cycles", "nb_modules", "clean_mode"]
+ZOOM_COLUMNS = [
+    "device_id", "lastname", "serial_number", "hardware_version", "created_at",
+    "nb_cycles", "nb_modules", "global_soh", "working_mode_code", "clean_mode",
+    "firmware_versions", "component_serial_numbers",
+]
+RANKING_COLUMNS = ["device_id", "lastname", "serial_number", "hardware_version"]
+FAULTS_COLUMNS = ["device_id", "hardware_version", "firmware_version"]
+REPORT_COLUMNS = [
+    "device_id", "lastname", "serial_number", "hardware_version", "global_soh",
+    "nb_cycles", "nb_modules", "clean_mode",
+]
+SCAN_COLUMNS = ["device_id", "lastname", "serial_number", "hardware_version", "reversed_ct"]
+
+# Colonnes dérivées calculées une fois au chargement
+DERIVED_COLUMNS = ["clean_mode"]
+
+# Schéma compact du frame partagé
+CATEGORY_COLUMNS = [
+    "hardware_version", "working_mode_code", "clean_mode", "warranty_status",
+    "time_zone_id", "city", "firmware_version",
+]
+INTEGER_COLUMNS = ["nb_cycles", "nb_modules", "soc", "user_id"]
+JSON_COLUMNS = ["firmware_versions", "component_serial_numbers"]
+
+REFRESH_INTERVAL_S = int(os.environ.get("BEEM_FLEET_REFRESH_S", 900))
+
+logger = logging.getLogger(__name__)
+
+PROJECTIONS = [
+    APP_COLUMNS, KPI_COLUMNS, ZOOM_COLUMNS, RANKING_COLUMNS, FAULTS_COLUMNS, REPORT_COLUMNS, SCAN_COLUMNS,
+]
+LOADED_COLUMNS = list(dict.fromkeys(
+    c for cols in PROJECTIONS for c in cols if c not in DERIVED_COLUMNS
+))
+
+
+def _smallest_int(series):
+    """Plus petit entier nullable (Int8...Int64) qui contient toutes les valeurs."""
+    if series.notna().any():
+        lo, hi = series.min(), series.max()
+        for dtype in ("Int8", "Int16", "Int32"):
+            info = np.iinfo(dtype.lower())
+            if info.min <= lo and hi <= info.max:
+                return series.astype(dtype)
+    return series.astype("Int64")
+
+
+def compact_fleet(df):
+    """Réduit les entiers de l'inventaire ; types et catégories viennent du schéma Arrow (``FLEET_SCHEMA``)."""
+    df["device_id"] = pd.to_numeric(df["device_id"], downcast="integer")
+    for col in INTEGER_COLUMNS:
+        if col in df.columns:
+            df[col] = _smallest_int(df[col])
+    return df
+
+
+def _clean_modes(working_mode_code):
+    """Mode sans préfixe matériel, calculé sur les catégories et non ligne à ligne."""
+    labels = working_mode_code.cat.categories.str.replace(r"^ampace_v[12]_", "", regex=True)
+    # Le code -1 (mode inconnu) désigne le dernier libellé : "Inconnu"
+    modes, codes = np.unique(np.append(labels.to_numpy(dtype=object), "Inconnu"), return_inverse=True)
+    return pd.Categorical.from_codes(codes[working_mode_code.cat.codes.to_numpy()], modes)
+
+
+def read_fleet():
+    """Requête d'inventaire + colonnes dérivées + schéma compact."""
+    df = get_data_source().fleet_inventory(LOADED_COLUMNS)
+    df = df.dropna(subset=["device_id"]).reset_index(drop=True)
+    df["clean_mode"] = _clean_modes(df["working_mode_code"])
+    return compact_fleet(df)
+
+
+def _check_columns(columns):
+    columns = list(columns)
+    missing = set(columns) - set(LOADED_COLUMNS) - set(DERIVED_COLUMNS)
+    if missing:
+        raise KeyError(f"Colonnes non chargées (ajouter une projection dans fleet.py) : {sorted(missing)}")
+    return columns
+
+
+class FleetIndex:
+    """Index de recherche des sélecteurs liés, construit une fois avec l'inventaire.
+
+    lastname -> device_ids, serial -> device_ids, device_id -> position de ligne,
+    et recherche par préfixe (insensible à la casse) sur les noms et les séries.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        device_ids = df["device_id"].to_numpy()
+        self.position = dict(zip(device_ids.tolist(), range(len(df))))
+        self._device_ids = sorted(self.position)
+        self.by_lastname = self._group(df["lastname"], device_ids)
+        self.by_serial = self._group(df["serial_number"], device_ids)
+        self._lastname_keys, self._lastnames = self._prefix_keys(self.by_lastname)
+        self._serial_keys, self._serials = self._prefix_keys(self.by_serial)
+
+    @staticmethod
+    def _group(keys, device_ids):
+        keys = keys.to_numpy(dtype=object)
+        valid = pd.notna(keys)
+        codes, uniques = pd.factorize(keys[valid])
+        ids = device_ids[valid]
+        order = np.lexsort((ids, codes))
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        ids = ids[order]
+        # Tranches (vues) du tableau trié des device_ids
+        return {key: ids[bounds[i]:bounds[i + 1]] for i, key in enumerate(uniques)}
+
+    @staticmethod
+    def _prefix_keys(mapping):
+        pairs = sorted((str(key).casefold(), key) for key in mapping)
+        return [k for k, _ in pairs], [v for _, v in pairs]
+
+    @staticmethod
+    def _search(keys, values, prefix, limit):
+        prefix = prefix.strip().casefold()
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\uffff") if prefix else len(keys)
+        return values[lo:min(hi, lo + limit) if limit else hi]
+
+    def search_lastnames(self, prefix="", limit=None):
+        return self._search(self._lastname_keys, self._lastnames, prefix, limit)
+
+    def search_serials(self, prefix="", limit=None):
+        return self._search(self._serial_keys, self._serials, prefix, limit)
+
+    def devices(self, lastname=None, serial=None):
+        """device_ids triés correspondant au nom et/ou au numéro de série."""
+        if lastname is None and serial is None:
+            return self._device_ids
+        candidates = None
+        for mapping, key in ((self.by_lastname, lastname), (self.by_serial, serial)):
+            if key is not None:
+                found = set(mapping.get(key, np.empty(0, dtype=np.int64)).tolist())
+                candidates = found if candidates is None else candidates & found
+        return sorted(candidates)
+
+    def rows(self, device_ids, columns):
+        """Lignes des device_ids dans ce même inventaire (cohérent avec ``position``)."""
+        return self.df.iloc[[self.position[d] for d in device_ids]][_check_columns(columns)]
+
+
+class FleetStore:
+    """Version courante de l'inventaire et de son index, rechargée en arrière-plan.
+
+    Les lecteurs prennent ``store.df`` / ``store.index`` sans verrou : le
+    remplacement se fait en une affectation, une fois le nouvel inventaire
+    et son index construits.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL_S):
+        self.interval = interval
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.watermark = None
+        self.loaded_at = None
+        self.refreshed_at = None
+        # (inventaire, index, numéro de version), remplacé d'un bloc
+        self.snapshot = (None, None, 0)
+        self.refresh(force=True)
+        if interval > 0:
+            threading.Thread(target=self._run, name="fleet-refresh", daemon=True).start()
+
+    @property
+    def df(self):
+        return self.snapshot[0]
+
+    @property
+    def index(self):
+        return self.snapshot[1]
+
+    @property
+    def version(self):
+        return self.snapshot[2]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                # L'inventaire précédent reste servi ; nouvel essai à l'intervalle suivant
+                logger.exception("Échec du rechargement de l'inventaire")
+
+    def refresh(self, force=False):
+        """Recharge si le filigrane a bougé (ou si ``force``) ; renvoie True si rechargé."""
+        with self._refresh_lock:
+            watermark = get_data_source().fleet_watermark()
+            self.refreshed_at = pd.Timestamp.now(tz="UTC")
+            if not force and watermark == self.watermark:
+                return False
+            df = read_fleet()
+            self.snapshot = (df, FleetIndex(df), self.version + 1)
+            self.watermark = watermark
+            self.loaded_at = self.refreshed_at
+            return True
+
+    def stop(self):
+        self._stop.set()
+
+
+@traced_cache(st.cache_resource)
+def fleet_store():
+    return FleetStore()
+
+
+def _load_fleet():
+    return fleet_store().df
+
+
+def load_fleet(columns):
+    """Projection de l'inventaire partagé (ne pas modifier le résultat en place)."""
+    return _load_fleet()[_check_columns(columns)]
+
+
+def load_fleet_index():
+    """Index de la version courante ; ``index.df`` est l'inventaire qui lui correspond."""
+    return fleet_store().index
+
+
+@lru_cache(maxsize=4096)
+def _parse_json(raw):
+    return json.loads(raw)
+
+
+def json_value(raw):
+    """Décode une cellule JSON (firmware_versions...) à la demande, avec cache."""
+    if not isinstance(raw, str):
+        # Déjà décodé par le backend (type JSON BigQuery) ou absent
+        return None if raw is None or raw is pd.NA or raw != raw else raw
+    return _parse_json(raw)
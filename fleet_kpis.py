@@ -0,0 +1,98 @@
+"""Indicateurs agrégés du parc pour la page d'accueil.
+
+Histogrammes (bornes et effectifs) et répartitions par catégorie sont calculés
+une fois par version de l'inventaire, en NumPy sur les codes catégoriels : les
+graphes ne reçoivent que ces agrégats (quelques dizaines de valeurs) et non
+une ligne par batterie, quelle que soit la taille du parc.
+"""
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from fleet import KPI_COLUMNS, fleet_store
+from instrumentation import traced_cache
+
+MISSING_LABEL = "Inconnu"
+HISTOGRAM_BINS = 20
+
+
+def histogram(values, nbins=HISTOGRAM_BINS, fill_value=np.nan):
+    """Effectifs par intervalle : colonnes ``start``, ``end``, ``center``, ``count``.
+
+    Les manquants valent ``fill_value`` (ignorés par défaut).
+    """
+    values = values.to_numpy(dtype=float, na_value=fill_value)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return pd.DataFrame(columns=["start", "end", "center", "count"])
+    counts, edges = np.histogram(values, bins=nbins)
+    return pd.DataFrame({
+        "start": edges[:-1],
+        "end": edges[1:],
+        "center": (edges[:-1] + edges[1:]) / 2,
+        "count": counts,
+    })
+
+
+def histogram_figure(bins, title, x_label):
+    """Histogramme Plotly à partir des effectifs déjà calculés (une barre par intervalle)."""
+    fig = px.bar(
+        bins, x="center", y="count", title=title,
+        hover_data={"start": ":.1f", "end": ":.1f", "center": False},
+        labels={"center": x_label, "count": "count", "start": "de", "end": "à"},
+    )
+    if len(bins):
+        fig.update_traces(width=float(bins["end"].iloc[0] - bins["start"].iloc[0]))
+    fig.update_layout(bargap=0)
+    return fig
+
+
+def _codes(series):
+    """Codes (-1 = manquant) et libellés d'une colonne, catégorielle ou non."""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    return series.cat.codes.to_numpy(), [str(c) for c in series.cat.categories]
+
+
+def category_counts(series, missing=MISSING_LABEL):
+    """Nombre de lignes par valeur (manquants regroupés), valeurs absentes exclues."""
+    codes, labels = _codes(series)
+    # Décalage de 1 : le code -1 (manquant) devient la case 0
+    counts = np.bincount(codes + 1, minlength=len(labels) + 1)
+    result = pd.Series(counts, index=[missing, *labels], name="count")
+    return result[result > 0].sort_values(ascending=False)
+
+
+def cross_counts(rows, columns):
+    """Tableau croisé des effectifs de deux colonnes (manquants exclus)."""
+    row_codes, row_labels = _codes(rows)
+    col_codes, col_labels = _codes(columns)
+    known = (row_codes >= 0) & (col_codes >= 0)
+    flat = row_codes[known].astype(np.int64) * len(col_labels) + col_codes[known]
+    counts = np.bincount(flat, minlength=len(row_labels) * len(col_labels))
+    return pd.DataFrame(counts.reshape(len(row_labels), len(col_labels)), index=row_labels, columns=col_labels)
+
+
+def compute_kpis(df, nbins=HISTOGRAM_BINS):
+    return {
+        "hardware": category_counts(df["hardware_version"]),
+        "soh": histogram(df["global_soh"], nbins),
+        # Cycles inconnus comptés à 0, comme dans l'affichage d'origine
+        "cycles": histogram(df["nb_cycles"], nbins, fill_value=0),
+        "modules": category_counts(df["nb_modules"]),
+        "modes": cross_counts(df["hardware_version"], df["clean_mode"]),
+    }
+
+
+@traced_cache(partial(st.cache_resource, max_entries=2))
+def _load_kpis(version, _df):
+    return compute_kpis(_df[KPI_COLUMNS])
+
+
+def load_fleet_kpis():
+    """Agrégats de la version courante de l'inventaire (recalculés à chaque nouvelle version)."""
+    df, _, version = fleet_store().snapshot
+    return _load_kpis(version, df)
@@ -0,0 +1,113 @@
+"""Carte du parc agrégée côté serveur.
+
+Selon le niveau de zoom, les batteries de la vue sont regroupées en cellules
+d'une grille (une par ~``CELL_PX`` pixels) avec leur nombre par mode de
+fonctionnement, ou affichées individuellement (marqueurs WebGL) quand la vue
+en contient moins que le budget ``MAX_MARKERS``. Le nombre de points envoyés au
+navigateur reste borné quelle que soit la taille du parc.
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+MAP_MODES = ("auto", "clusters", "points")
+MAX_MARKERS = 2000
+CELL_PX = 40
+MAP_WIDTH_PX = 1200
+MAP_HEIGHT_PX = 600
+TILE_PX = 256
+
+
+def viewport(center_lat, center_lon, zoom, width_px=MAP_WIDTH_PX, height_px=MAP_HEIGHT_PX):
+    """Bornes (lat_min, lat_max, lon_min, lon_max) approximatives de la vue affichée."""
+    deg_per_px = 360 / (TILE_PX * 2 ** zoom)
+    half_lon = deg_per_px * width_px / 2
+    half_lat = deg_per_px * height_px / 2 * np.cos(np.radians(center_lat))
+    return center_lat - half_lat, center_lat + half_lat, center_lon - half_lon, center_lon + half_lon
+
+
+def in_viewport(df, bounds):
+    lat_min, lat_max, lon_min, lon_max = bounds
+    lat = df["latitude"].to_numpy()
+    lon = df["longitude"].to_numpy()
+    return df[(lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)]
+
+
+def aggregate_cells(df, zoom, color="clean_mode"):
+    """Une ligne par cellule occupée : position moyenne, total et nombre par ``color``."""
+    cell_deg = 360 / (TILE_PX * 2 ** zoom) * CELL_PX
+    cells = pd.DataFrame({
+        "cell_lat": np.floor(df["latitude"].to_numpy() / cell_deg).astype(np.int64),
+        "cell_lon": np.floor(df["longitude"].to_numpy() / cell_deg).astype(np.int64),
+        "latitude": df["latitude"].to_numpy(),
+        "longitude": df["longitude"].to_numpy(),
+        color: df[color].to_numpy(),
+    })
+    grouped = cells.groupby(["cell_lat", "cell_lon"])
+    result = grouped[["latitude", "longitude"]].mean()
+    counts = cells.groupby(["cell_lat", "cell_lon", color], observed=True).size().unstack(fill_value=0)
+    result["total"] = counts.sum(axis=1)
+    result["dominant"] = counts.idxmax(axis=1)
+    result["detail"] = [
+        "<br>".join(f"{mode} : {n}" for mode, n in row.items() if n)
+        for row in counts.to_dict("records")
+    ]
+    return result.reset_index(drop=True)
+
+
+def _colors(modes):
+    palette = px.colors.qualitative.Plotly
+    return {mode: palette[i % len(palette)] for i, mode in enumerate(sorted(modes))}
+
+
+def build_map_figure(df, zoom, center, mode="auto", max_markers=MAX_MARKERS):
+    """Figure de la carte et résumé ``(n_batteries_vue, n_marqueurs, agrégé)``."""
+    df = df.dropna(subset=["latitude", "longitude"])
+    visible = in_viewport(df, viewport(center[0], center[1], zoom))
+    colors = _colors(df["clean_mode"].astype(str).unique())
+
+    clustered = mode == "clusters" or (mode == "auto" and len(visible) > max_markers)
+    if mode == "points" and len(visible) > max_markers:
+        # Budget de points respecté même en mode forcé
+        visible = visible.sample(max_markers, random_state=0)
+
+    fig = go.Figure()
+    if clustered:
+        cells = aggregate_cells(visible, zoom)
+        cells["size"] = 8 + 30 * np.sqrt(cells["total"] / max(cells["total"].max(), 1))
+        for dominant, group in cells.groupby("dominant"):
+            fig.add_trace(go.Scattermap(
+                lat=group["latitude"],
+                lon=group["longitude"],
+                mode="markers",
+                marker=dict(size=group["size"], color=colors[dominant], opacity=0.7),
+                text=group["total"].astype(str) + " batteries<br>" + group["detail"],
+                hoverinfo="text",
+                name=dominant,
+            ))
+        n_markers = len(cells)
+    else:
+        for clean_mode, group in visible.groupby("clean_mode", observed=True):
+            fig.add_trace(go.Scattermap(
+                lat=group["latitude"],
+                lon=group["longitude"],
+                mode="markers",
+                marker=dict(size=7, color=colors[clean_mode]),
+                customdata=group[["device_id", "hardware_version", "nb_cycles"]].to_numpy(),
+                text=group["lastname"],
+                hovertemplate=(
+                    "<b>%{text}</b><br>device_id=%{customdata[0]}<br>"
+                    "hardware_version=%{customdata[1]}<br>nb_cycles=%{customdata[2]}<extra></extra>"
+                ),
+                name=clean_mode,
+            ))
+        n_markers = len(visible)
+
+    fig.update_layout(
+        map=dict(style="open-street-map", center=dict(lat=center[0], lon=center[1]), zoom=zoom),
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        height=MAP_HEIGHT_PX,
+        legend_title="clean_mode",
+    )
+    return fig, (len(visible), n_markers, clustered)
@@ -0,0 +1,224 @@
+"""Instrumentation des pages : temps par section, coût des requêtes et du cache.
+
+Activée par la case « ⏱️ Instrumentation » de la barre latérale (cochée par
+défaut si ``BEEM_TRACE=1``). Chaque exécution de page collecte des événements :
+
+- ``section`` : temps écoulé depuis le ``checkpoint`` précédent de la page ;
+- ``query`` : lecture backend (durée, lignes, octets traités/facturés par
+  BigQuery ou taille du fichier Parquet lu pour le snapshot) ;
+- ``cache`` : appel d'une fonction en cache (hit/miss, durée, lignes) ;
+- ``figure`` : sérialisation d'une figure Plotly (durée, octets envoyés).
+
+Les sections déclarées avec ``fragment`` sont relançables seules
+(``st.fragment``) : une relance partielle s'exécute dans un autre thread, sans
+trace de page ; la page instrumentée est retenue dans ``st.session_state`` et
+la relance ouvre sa propre trace, de page ``<page>:<section>``, écrite dans le
+même fichier.
+
+Les événements sont affichés dans la barre latérale en fin de page et ajoutés
+au fichier JSONL ``BEEM_TRACE_FILE`` (``traces.jsonl`` par défaut), une ligne
+par événement. Désactivée, l'instrumentation se limite à une lecture de
+``ContextVar`` par appel.
+"""
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+DEFAULT_TRACE_FILE = Path(__file__).resolve().parent / "traces.jsonl"
+
+# Page instrumentée de la session (None : désactivé), lue par les relances de fragments
+TRACE_STATE_KEY = "trace_page"
+
+_current = ContextVar("beem_trace", default=None)
+_cache_misses = ContextVar("beem_cache_misses", default=None)
+_file_lock = threading.Lock()
+
+
+class Trace:
+    """Événements d'une exécution de page."""
+
+    def __init__(self, page):
+        self.page = page
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.events = []
+        # Écrite par ``show_trace`` : les relances de fragments ouvrent leur propre trace
+        self.closed = False
+        self._start = self._last = time.perf_counter()
+
+    def record(self, kind, name, **fields):
+        self.events.append({"kind": kind, "name": name, **fields})
+
+    def checkpoint(self, name):
+        now = time.perf_counter()
+        self.record("section", name, seconds=round(now - self._last, 6))
+        self._last = now
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def write(self, path=None):
+        path = Path(path or os.environ.get("BEEM_TRACE_FILE", DEFAULT_TRACE_FILE))
+        header = {"run_id": self.run_id, "page": self.page, "started_at": self.started_at}
+        lines = "".join(json.dumps({**header, **event}, default=str) + "\n" for event in self.events)
+        with _file_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def start_trace(page):
+    """Case de la barre latérale ; démarre la trace de cette exécution si cochée."""
+    enabled = st.sidebar.checkbox("⏱️ Instrumentation", value=os.environ.get("BEEM_TRACE") == "1")
+    trace = Trace(page) if enabled else None
+    _current.set(trace)
+    st.session_state[TRACE_STATE_KEY] = page if enabled else None
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def record(kind, name, **fields):
+    trace = _current.get()
+    if trace is not None:
+        trace.record(kind, name, **fields)
+
+
+def checkpoint(name):
+    """Clôt la section ``name`` de la page (temps depuis le checkpoint précédent)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.checkpoint(name)
+
+
+@contextmanager
+def timed(kind, name):
+    """Chronomètre le bloc ; le dict renvoyé reçoit les champs à enregistrer (rows...)."""
+    fields = {}
+    trace = _current.get()
+    if trace is None:
+        yield fields
+        return
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        trace.record(kind, name, seconds=round(time.perf_counter() - start, 6), **fields)
+
+
+def _rows(result):
+    if isinstance(result, tuple):
+        result = result[0]
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def traced_cache(cache):
+    """Variante instrumentée d'un décorateur ``st.cache_*`` : enregistre hit/miss et durée.
+
+    Un miss est détecté quand la fonction d'origine s'exécute pendant l'appel.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            misses = _cache_misses.get()
+            if misses is not None:
+                misses.append(func.__name__)
+            return func(*args, **kwargs)
+
+        cached = cache(compute)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return cached(*args, **kwargs)
+            misses = []
+            token = _cache_misses.set(misses)
+            try:
+                with timed("cache", func.__name__) as fields:
+                    result = cached(*args, **kwargs)
+                    fields.update(hit=not misses, rows=_rows(result))
+            finally:
+                _cache_misses.reset(token)
+            return result
+
+        wrapper.clear = cached.clear
+        return wrapper
+
+    return decorator
+
+
+def fragment(name):
+    """Section relançable seule (``st.fragment``), close comme un ``checkpoint``.
+
+    Lors d'une exécution complète de la page, la section s'inscrit dans sa
+    trace. Relancée seule par un de ses widgets (autre thread, sans trace de
+    page), elle enregistre sa propre trace et affiche sa durée si
+    l'instrumentation est active pour la session.
+    """
+    def decorator(func):
+        @st.fragment
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            page_trace = _current.get()
+            if page_trace is not None and not page_trace.closed:
+                result = func(*args, **kwargs)
+                page_trace.checkpoint(name)
+                return result
+            page = st.session_state.get(TRACE_STATE_KEY)
+            if page is None:
+                return func(*args, **kwargs)
+            # Relance partielle
+            trace = Trace(f"{page}:{name}")
+            token = _current.set(trace)
+            try:
+                result = func(*args, **kwargs)
+                trace.checkpoint(name)
+            finally:
+                _current.reset(token)
+            st.caption(f"⏱️ Section relancée seule en {trace.elapsed * 1000:.0f} ms")
+            trace.write()
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def plotly_chart(fig, name, container=None, **kwargs):
+    """``st.plotly_chart`` avec mesure de la taille du JSON envoyé au navigateur."""
+    if _current.get() is not None:
+        with timed("figure", name) as fields:
+            fields["bytes"] = len(fig.to_json())
+    return (container or st).plotly_chart(fig, **kwargs)
+
+
+def show_trace(trace):
+    """Affiche la trace dans la barre latérale et l'ajoute au fichier JSONL."""
+    if trace is None:
+        return
+    trace.closed = True
+    events = pd.DataFrame(trace.events)
+    st.sidebar.metric("Durée de la page", f"{trace.elapsed:.2f} s")
+    if events.empty:
+        return
+    by_kind = events.groupby("kind")["seconds"].agg(["count", "sum"]).round(3)
+    st.sidebar.dataframe(by_kind, use_container_width=True)
+    if "bytes_billed" in events:
+        st.sidebar.metric("Octets facturés BigQuery", f"{events['bytes_billed'].sum() / 1e6:.1f} Mo")
+    st.sidebar.dataframe(events, use_container_width=True, hide_index=True)
+    trace.write()
+    st.sidebar.caption(f"Trace {trace.run_id} ajoutée au fichier JSONL")
@@ -0,0 +1,95 @@
+"""Index des logs fault/warning de tout le parc.
+
+Les logs sont chargés en une requête puis triés par (battery_id, date) :
+les logs d'une batterie, ou d'une batterie sur quelques mois, sont une tranche
+contiguë retrouvée par recherche binaire, sans copie ni requête. ``type`` et
+``message`` sont stockés en catégories : les regroupements se font sur leurs
+codes entiers et non sur des chaînes.
+
+L'index est partagé par process et reconstruit toutes les ``TTLS["logs"]``
+secondes, comme les logs du cache de requêtes.
+"""
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_source import get_data_source
+from instrumentation import traced_cache
+from query_cache import TTLS
+
+LOG_COLUMNS = ["date", "type", "message", "cleared", "cleared_at", "cleared_by"]
+
+
+class LogIndex:
+    def __init__(self, df):
+        # date (UTC), type et message (catégories) sont typés à la lecture
+        df = df.sort_values(["battery_id", "date"], kind="stable").reset_index(drop=True)
+        # Partition par mois (aaaamm) pour les découpes temporelles
+        df["month"] = (df["date"].dt.year * 100 + df["date"].dt.month).astype("int32")
+        self.df = df
+        self._battery_ids = df["battery_id"].to_numpy()
+
+    def __len__(self):
+        return len(self.df)
+
+    def _bounds(self, battery_id):
+        lo = np.searchsorted(self._battery_ids, battery_id, side="left")
+        hi = np.searchsorted(self._battery_ids, battery_id, side="right")
+        return lo, hi
+
+    def for_device(self, battery_id, first_month=None, last_month=None):
+        """Logs d'une batterie, du plus récent au plus ancien (tranche de l'index)."""
+        lo, hi = self._bounds(battery_id)
+        if first_month is not None or last_month is not None:
+            months = self.df["month"].to_numpy()[lo:hi]
+            start = 0 if first_month is None else np.searchsorted(months, first_month, side="left")
+            stop = len(months) if last_month is None else np.searchsorted(months, last_month, side="right")
+            lo, hi = lo + start, lo + stop
+        return self.df.iloc[lo:hi][LOG_COLUMNS].iloc[::-1]
+
+    def top_faults(self, battery_groups, types=("fault", "warning"), first_month=None, last_month=None):
+        """Nombre de logs par (groupe, type, message) sur tout le parc.
+
+        ``battery_groups`` est une série battery_id -> groupe (version firmware,
+        version hardware...). Le regroupement se fait sur des codes entiers.
+        """
+        df = self.df
+        mask = df["type"].isin(types).to_numpy()
+        if first_month is not None:
+            mask = mask & (df["month"].to_numpy() >= first_month)
+        if last_month is not None:
+            mask = mask & (df["month"].to_numpy() <= last_month)
+
+        groups = battery_groups[~battery_groups.index.duplicated()].astype("category")
+        positions = pd.Index(groups.index).get_indexer(df["battery_id"].to_numpy()[mask])
+        known = positions >= 0
+
+        codes = pd.DataFrame({
+            "group": groups.cat.codes.to_numpy()[positions[known]],
+            "type": df["type"].cat.codes.to_numpy()[mask][known],
+            "message": df["message"].cat.codes.to_numpy()[mask][known],
+        })
+        counts = codes.groupby(["group", "type", "message"]).size().reset_index(name="count")
+        # Libellés uniquement sur le résultat agrégé
+        for col, categories in (
+            ("group", groups.cat.categories),
+            ("type", df["type"].cat.categories),
+            ("message", df["message"].cat.categories),
+        ):
+            counts[col] = pd.Categorical.from_codes(counts[col], categories)
+        return counts.sort_values("count", ascending=False, ignore_index=True)
+
+
+def summarize(logs):
+    """Nombre de logs par type + message, regroupés sur les codes catégoriels."""
+    summary = logs.groupby(["type", "message"], observed=True).size().reset_index(name="count")
+    summary.insert(0, "type_message", summary["type"].astype(str) + " - " + summary["message"].astype(str))
+    return summary[["type_message", "count"]].sort_values(by="count", ascending=False)
+
+
+@traced_cache(partial(st.cache_resource, ttl=TTLS["logs"]))
+def load_log_index():
+    """Index du parc, reconstruit après la durée de vie des logs dans le cache de requêtes."""
+    return LogIndex(get_data_source().logs())
@@ -0,0 +1,131 @@
+"""Cache disque des mesures, partitionné par jour.
+
+Chaque (table, device) a un dossier ``<table>/<device_id>/`` contenant un
+fichier Parquet par jour UTC. Pour une plage demandée, seuls les jours absents
+sont interrogés (une requête par suite de jours consécutifs) puis recollés aux
+partitions déjà présentes. Un jour clos depuis plus de ``SETTLE_DELAY`` est
+considéré immuable ; les jours plus récents sont toujours relus à la source.
+
+Activé par défaut devant BigQuery ; ``BEEM_MEASURE_CACHE=0`` le désactive et
+``BEEM_MEASURE_CACHE_DIR`` change son emplacement.
+"""
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from data_source import DataSource, _check_measure_table
+from instrumentation import record
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / "cache" / "measures"
+
+# Délai après la fin d'un jour avant de le considérer complet (synchro airbyte quotidienne)
+SETTLE_DELAY = pd.Timedelta(days=1)
+
+
+def _day_runs(days):
+    """Regroupe des jours triés en suites consécutives [(premier, dernier), ...]."""
+    runs = []
+    for day in days:
+        if runs and day - runs[-1][1] == pd.Timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+
+class CachedMeasuresSource(DataSource):
+    """Enveloppe un backend et met ses mesures en cache disque par jour."""
+
+    def __init__(self, inner, root=None):
+        self.inner = inner
+        self.name = inner.name
+        self.root = Path(root or os.environ.get("BEEM_MEASURE_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+    def __getattr__(self, attr):
+        return getattr(self.inner, attr)
+
+    def fleet_inventory(self, columns=None):
+        return self.inner.fleet_inventory(columns)
+
+    def fleet_watermark(self):
+        return self.inner.fleet_watermark()
+
+    def objectives(self, battery_id=None):
+        return self.inner.objectives(battery_id)
+
+    def monthly_production(self, battery_id=None):
+        return self.inner.monthly_production(battery_id)
+
+    def logs(self, battery_id=None, types=("fault", "warning")):
+        return self.inner.logs(battery_id, types)
+
+    def rollup(self, table_name, resolution, device_id, start_dt, end_dt):
+        # Agrégats déjà compacts : pas de cache disque
+        return self.inner.rollup(table_name, resolution, device_id, start_dt, end_dt)
+
+    def measures_many(self, table_name, device_ids, start_dt, end_dt):
+        # Une seule requête pour toutes les batteries (ou tout le parc) : pas de cache par device
+        return self.inner.measures_many(table_name, device_ids, start_dt, end_dt)
+
+    def rollup_many(self, table_name, resolution, device_ids, start_dt, end_dt):
+        return self.inner.rollup_many(table_name, resolution, device_ids, start_dt, end_dt)
+
+    def daily_many(self, table_name, device_ids, start_dt, end_dt):
+        # Sommes journalières calculées par le backend : pas de cache par device
+        return self.inner.daily_many(table_name, device_ids, start_dt, end_dt)
+
+    def rollup_watermark(self, table_name, resolution):
+        return self.inner.rollup_watermark(table_name, resolution)
+
+    def partition_path(self, table_name, device_id, day):
+        return self.root / table_name / str(device_id) / f"{day:%Y-%m-%d}.parquet"
+
+    def _is_immutable(self, day):
+        return day + pd.Timedelta(days=1) + SETTLE_DELAY <= pd.Timestamp.now(tz="UTC").tz_localize(None)
+
+    def _write_partition(self, path, df):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+
+    def _fetch_run(self, table_name, device_id, first_day, last_day):
+        """Charge une suite de jours en une requête et écrit les partitions immuables."""
+        end_of_run = last_day + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+        df = self.inner.measures(table_name, device_id, first_day.isoformat(), end_of_run.isoformat())
+        days = df["date"].dt.tz_localize(None).dt.normalize()
+        parts = []
+        for day in pd.date_range(first_day, last_day, freq="D"):
+            part = df[(days == day).to_numpy()]
+            if self._is_immutable(day):
+                # Même un jour vide est écrit : il ne sera plus redemandé
+                self._write_partition(self.partition_path(table_name, device_id, day), part)
+            parts.append(part)
+        return parts
+
+    def measures(self, table_name, device_id, start_dt, end_dt):
+        _check_measure_table(table_name)
+        start, end = pd.Timestamp(start_dt), pd.Timestamp(end_dt)
+        days = pd.date_range(start.normalize(), end.normalize(), freq="D")
+
+        parts, missing = [], []
+        for day in days:
+            path = self.partition_path(table_name, device_id, day)
+            if self._is_immutable(day) and path.exists():
+                parts.append(pd.read_parquet(path))
+            else:
+                missing.append(day)
+
+        record("cache", f"measures:{table_name}", hit=not missing,
+               days_cached=len(days) - len(missing), days_fetched=len(missing))
+        for first_day, last_day in _day_runs(missing):
+            parts.extend(self._fetch_run(table_name, device_id, first_day, last_day))
+
+        parts = [p for p in parts if not p.empty] or parts[:1]
+        if not parts:
+            return self.inner.measures(table_name, device_id, start_dt, end_dt)
+        df = pd.concat(parts, ignore_index=True)
+
+        dates = df["date"].dt.tz_localize(None)
+        return df[dates.between(start, end).to_numpy()].reset_index(drop=True)
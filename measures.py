@@ -0,0 +1,78 @@
+"""Registre des sources de mesures et chargement concurrent.
+
+Les sources sélectionnées sont chargées en parallèle (pool de threads borné) :
+la latence d'une vue froide est celle de la source la plus lente et non la
+somme des requêtes.
+"""
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+sources = {
+    "battery_active_energy_measure": {
+        "title": "Consommation infra-journalière",
+        "y_label": "Wh par batterie",
+        "agg": False,
+    },
+    "battery_active_returned_energy_meter_measure": {
+        "title": "Ré-injection infra-journalière",
+        "y_label": "Wh par batterie",
+        "agg": False,
+    },
+    "battery_active_returned_energy_measure": {
+        "title": "Production solaire (somme MPPT)",
+        "y_label": "Wh total",
+        "agg": True,
+    },
+    "battery_energy_charged_measure": {
+        "title": "Énergie stockée (batterie)",
+        "y_label": "Wh",
+        "agg": False,
+    },
+    "battery_energy_discharged_measure": {
+        "title": "Énergie déstockée (batterie)",
+        "y_label": "Wh",
+        "agg": False,
+    },
+}
+
+MAX_WORKERS = 5
+SOURCE_TIMEOUT_S = 120
+
+
+def fetch_concurrently(loader, tables, *args, max_workers=MAX_WORKERS, timeout=SOURCE_TIMEOUT_S):
+    """Appelle ``loader(table, *args)`` pour chaque table en parallèle.
+
+    Générateur qui renvoie ``(table, df, erreur)`` au fil de l'arrivée des
+    résultats. Une source qui dépasse ``timeout`` secondes depuis son démarrage
+    est abandonnée avec une ``TimeoutError`` (son thread termine en arrière-plan).
+    """
+    tables = list(tables)
+    if not tables:
+        return
+
+    started = {}
+
+    def run(table):
+        started[table] = time.monotonic()
+        return loader(table, *args)
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(tables)))
+    try:
+        # Chaque thread reçoit une copie du contexte (trace d'instrumentation)
+        pending = {pool.submit(contextvars.copy_context().run, run, table): table for table in tables}
+        while pending:
+            done, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                table = pending.pop(future)
+                error = future.exception()
+                yield table, None if error else future.result(), error
+
+            now = time.monotonic()
+            for future, table in list(pending.items()):
+                if table in started and now - started[table] > timeout:
+                    del pending[future]
+                    future.cancel()
+                    yield table, None, TimeoutError(f"{table} : délai de {timeout} s dépassé")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
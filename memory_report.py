@@ -0,0 +1,56 @@
+"""Comptabilité mémoire des frames et des objets mis en cache par le process.
+
+Avec plusieurs analystes sur un même serveur Streamlit, la mémoire résidente
+par worker est la limite de montée en charge : ce rapport donne les octets par
+colonne de l'inventaire et par objet en cache.
+"""
+import pandas as pd
+
+
+def frame_memory(df):
+    """Octets par colonne (``deep=True``), triés par taille décroissante."""
+    usage = df.memory_usage(deep=True, index=False)
+    return pd.DataFrame({
+        "colonne": usage.index,
+        "dtype": [str(df[c].dtype) for c in usage.index],
+        "octets": usage.to_numpy(),
+    }).sort_values("octets", ascending=False, ignore_index=True)
+
+
+def object_memory(obj):
+    """Taille approximative (octets) d'un objet en cache."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, dict):
+        return sum(object_memory(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(object_memory(v) for v in obj)
+    if hasattr(obj, "series"):
+        return object_memory(obj.series)
+    if hasattr(obj, "df"):
+        return object_memory(obj.df)
+    return 0
+
+
+def cached_objects_report(include_lazy=False):
+    """Octets par objet en cache. ``include_lazy`` charge aussi les index non encore construits."""
+    import fleet
+    import timeseries
+
+    rows = [("Inventaire du parc (fleet)", object_memory(fleet._load_fleet()))]
+    with timeseries._cache_lock:
+        device_series = list(timeseries._cache.values())
+    rows.append((f"Séries de mesures ({len(device_series)} fenêtres)", object_memory(device_series)))
+
+    if include_lazy:
+        import logs
+        import realisation
+
+        table, by_battery = realisation.load_realisation()
+        rows.append(("Table de réalisation", object_memory(table) + object_memory(by_battery)))
+        rows.append(("Index des logs", object_memory(logs.load_log_index())))
+
+    report = pd.DataFrame(rows, columns=["objet", "octets"])
+    return report.sort_values("octets", ascending=False, ignore_index=True)
@@ -0,0 +1,89 @@
+import streamlit as st
+from datetime import datetime
+import os
+
+from energy_balance import ABS_TOLERANCE_WH, REL_TOLERANCE, check_balance, load_daily_balance, rank_anomalies
+from fleet import SCAN_COLUMNS, fleet_store
+from fleet_kpis import histogram, histogram_figure
+from instrumentation import checkpoint, plotly_chart, show_trace, start_trace
+
+# Authentification
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"C:\Users\floch\OneDrive\Documents\GCP_key\streamlit_app\beem-data-warehouse-14a923c674a0.json"
+
+st.set_page_config(page_title="Bilan énergétique", layout="wide")
+st.title("🩺 Cohérence du bilan énergétique du parc")
+st.caption(
+    "Consommation comparée à solaire + déstockage − stockage − ré-injection, jour par jour, "
+    "pour toutes les batteries : compteur cassé ou CT inversé."
+)
+trace = start_trace("bilan")
+
+# ========== 🎛️ Filtres ==========
+col1, col2 = st.columns(2)
+with col1:
+    start_date = st.date_input("Date de début", datetime(2025, 4, 1), key="start_balance")
+with col2:
+    end_date = st.date_input("Date de fin", datetime(2025, 4, 30), key="end_balance")
+
+col3, col4 = st.columns(2)
+with col3:
+    abs_tolerance = st.number_input("Tolérance absolue (Wh/jour)", min_value=0, value=ABS_TOLERANCE_WH, step=100)
+with col4:
+    rel_tolerance = st.number_input(
+        "Tolérance relative (part de l'énergie produite)", min_value=0.0, max_value=1.0,
+        value=REL_TOLERANCE, step=0.01,
+    )
+
+start_dt = datetime.combine(start_date, datetime.min.time()).isoformat()
+end_dt = datetime.combine(end_date, datetime.max.time()).isoformat()
+
+# ========== 📦 Chargement (une requête par source pour tout le parc) ==========
+df, _, version = fleet_store().snapshot
+fleet = df[SCAN_COLUMNS]
+try:
+    _, daily = load_daily_balance(version, start_dt, end_dt, fleet["device_id"].to_numpy())
+except RuntimeError as error:
+    st.error(f"Échec du chargement : {error}")
+    st.stop()
+checkpoint("chargement")
+
+# ========== 🧮 Contrôles vectorisés ==========
+anomalies = rank_anomalies(fleet, check_balance(daily, abs_tolerance, rel_tolerance))
+flagged = anomalies[anomalies["score"] > 0]
+checkpoint("contrôles")
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    st.metric("Batteries contrôlées", f"{int((anomalies['covered_days'] > 0).sum())} / {len(anomalies)}")
+with col2:
+    st.metric("Batteries en anomalie", len(flagged))
+with col3:
+    st.metric("dont CT inversé déclaré", int(flagged["reversed_ct"].fillna(False).astype(bool).sum()))
+
+# ========== 📋 Anomalies classées ==========
+st.subheader("📋 Anomalies classées")
+
+max_rows = st.slider("Nombre de lignes affichées", 10, 500, 100)
+table = flagged.head(max_rows).assign(
+    # Lien vers la page zoom, batterie pré-sélectionnée par paramètre d'URL
+    zoom=lambda d: "dashboard_zoom_battery?device_id=" + d["device_id"].astype(str)
+)
+st.dataframe(
+    table,
+    use_container_width=True,
+    hide_index=True,
+    column_config={
+        "zoom": st.column_config.LinkColumn("Zoom", display_text="🔍 Ouvrir"),
+        "score": st.column_config.ProgressColumn("Score", min_value=0.0, max_value=1.0, format="%.2f"),
+        "worst_gap_wh": st.column_config.NumberColumn("Pire déficit (Wh)", format="%.0f"),
+    },
+)
+
+if not flagged.empty:
+    plotly_chart(
+        histogram_figure(histogram(flagged["score"]), "Répartition des scores d'anomalie", "Score"),
+        "scores", use_container_width=True,
+    )
+checkpoint("anomalies")
+
+show_trace(trace)
@@ -0,0 +1,65 @@
+import streamlit as st
+import plotly.express as px
+import os
+
+from fleet import RANKING_COLUMNS, load_fleet
+from instrumentation import checkpoint, plotly_chart, show_trace, start_trace
+from realisation import RATE_COLUMN, fleet_ranking
+
+# Authentification
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"C:\Users\floch\OneDrive\Documents\GCP_key\streamlit_app\beem-data-warehouse-14a923c674a0.json"
+
+st.set_page_config(page_title="Classement réalisation", layout="wide")
+st.title("🏆 Classement du parc par taux de réalisation")
+trace = start_trace("classement")
+
+MOIS = {
+    0: "Cumul annuel", 1: "Janvier", 2: "Février", 3: "Mars", 4: "Avril", 5: "Mai", 6: "Juin",
+    7: "Juillet", 8: "Août", 9: "Septembre", 10: "Octobre", 11: "Novembre", 12: "Décembre",
+}
+
+# ========== 🎛️ Filtres ==========
+col1, col2 = st.columns(2)
+with col1:
+    month = st.selectbox("📅 Mois", list(MOIS.keys()), format_func=MOIS.get)
+with col2:
+    top_n = st.slider("Nombre de batteries affichées (haut / bas du classement)", 5, 50, 15)
+
+ranking = fleet_ranking(month or None)
+infos_df = load_fleet(RANKING_COLUMNS).set_index("device_id")
+ranking = ranking.join(infos_df, how="left").reset_index(names="device_id")
+checkpoint("classement")
+
+if ranking.empty:
+    st.info("Aucune donnée d'objectif ou de production pour ce mois.")
+    st.stop()
+
+# ========== 📊 Meilleures et moins bonnes batteries ==========
+col3, col4 = st.columns(2)
+for col, subset, title in (
+    (col3, ranking.head(top_n), "✅ Meilleurs taux de réalisation"),
+    (col4, ranking.tail(top_n), "⚠️ Taux de réalisation les plus faibles"),
+):
+    with col:
+        fig = px.bar(
+            subset.assign(device_id=subset["device_id"].astype(str)),
+            x=RATE_COLUMN,
+            y="device_id",
+            orientation="h",
+            hover_data=["lastname", "serial_number", "objective", "measured"],
+            title=title,
+            labels={"device_id": "device_id"},
+        )
+        fig.update_layout(yaxis=dict(autorange="reversed"))
+        plotly_chart(fig, title, use_container_width=True)
+checkpoint("graphes")
+
+# ========== 📋 Classement complet ==========
+st.subheader(f"📋 Classement complet ({len(ranking)} batteries)")
+st.dataframe(
+    ranking[["device_id", "lastname", "serial_number", "hardware_version", "objective", "measured", RATE_COLUMN]],
+    use_container_width=True,
+    height=500,
+)
+
+show_trace(trace)
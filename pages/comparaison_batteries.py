@@ -0,0 +1,135 @@
+import streamlit as st
+import plotly.express as px
+import plotly.graph_objects as go
+from datetime import datetime
+import os
+
+from comparison import MAX_DEVICES, load_comparison, normalize_columns, step_label
+from downsampling import DEFAULT_MAX_POINTS
+from fleet import load_fleet_index
+from instrumentation import checkpoint, plotly_chart, show_trace, start_trace
+from measures import sources
+from rollups import LABELS, RAW
+
+# Authentification
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"C:\Users\floch\OneDrive\Documents\GCP_key\streamlit_app\beem-data-warehouse-14a923c674a0.json"
+
+st.set_page_config(page_title="Comparaison batteries", layout="wide")
+st.title("⚖️ Comparaison de batteries")
+trace = start_trace("comparaison")
+
+# ========== 📦 Charger infos batteries ==========
+fleet_index = load_fleet_index()
+checkpoint("chargement")
+
+# ========== 🔌 Choix des batteries ==========
+st.subheader("🔌 Batteries à comparer")
+
+device_ids_input = st.text_input(
+    f"device_id à comparer (séparés par des virgules, {MAX_DEVICES} au plus)", "1, 2, 3"
+)
+requested = list(dict.fromkeys(int(x) for x in device_ids_input.replace(" ", "").split(",") if x.isdigit()))
+unknown = [d for d in requested if d not in fleet_index.position]
+if unknown:
+    st.warning(f"device_id inconnus ignorés : {unknown}")
+device_ids = [d for d in requested if d in fleet_index.position]
+if len(device_ids) > MAX_DEVICES:
+    st.warning(f"Seules les {MAX_DEVICES} premières batteries sont comparées.")
+    device_ids = device_ids[:MAX_DEVICES]
+
+if not device_ids:
+    st.info("Saisir au moins un device_id connu.")
+    st.stop()
+
+st.dataframe(
+    fleet_index.rows(device_ids, ["device_id", "lastname", "serial_number", "hardware_version"]),
+    hide_index=True, use_container_width=True,
+)
+checkpoint("sélecteurs")
+
+# ========== 🗓️ Filtres temporels ==========
+st.subheader("⏱️ Plage de temps")
+
+col1, col2 = st.columns(2)
+with col1:
+    start_date = st.date_input("Date de début", datetime(2025, 4, 1), key="start_compare")
+with col2:
+    end_date = st.date_input("Date de fin", datetime(2025, 4, 30), key="end_compare")
+
+start_datetime = datetime.combine(start_date, datetime.min.time())
+end_datetime = datetime.combine(end_date, datetime.max.time())
+if end_datetime <= start_datetime:
+    st.warning("La date de fin doit suivre la date de début.")
+    st.stop()
+
+# ========== 📈 Courbes comparées ==========
+st.subheader("📊 Mesures comparées")
+
+selected_sources = st.multiselect(
+    "Sources à comparer :",
+    options=list(sources.keys()),
+    format_func=lambda x: sources[x]["title"],
+    default=list(sources.keys())[:1],
+)
+
+col1, col2 = st.columns(2)
+with col1:
+    max_points = st.number_input(
+        "Points max par courbe", min_value=200, max_value=50_000,
+        value=DEFAULT_MAX_POINTS, step=500,
+    )
+with col2:
+    display = st.radio("Affichage", ["Superposition", "Petits multiples normalisés"], horizontal=True)
+
+if not selected_sources:
+    st.info("Sélectionner au moins une source.")
+    st.stop()
+
+# Une requête par source pour toutes les batteries, séries alignées sur une grille commune
+try:
+    aligned, resolution, step = load_comparison(
+        tuple(device_ids), start_datetime.isoformat(), end_datetime.isoformat(),
+        tuple(selected_sources), max_points,
+    )
+except RuntimeError as error:
+    st.error(f"Échec du chargement : {error}")
+    st.stop()
+
+st.caption(
+    f"Données lues : {LABELS[resolution]}"
+    + ("" if resolution == RAW else " (agrégats)")
+    + f" — grille commune : somme par pas de {step_label(step)}"
+)
+
+for table_name in selected_sources:
+    meta = sources[table_name]
+    wide = aligned[table_name]
+    if wide.isna().all().all():
+        st.warning(f"Aucune donnée pour : {meta['title']}")
+        continue
+
+    if display == "Superposition":
+        fig = go.Figure([
+            go.Scatter(x=wide.index, y=wide[device_id].to_numpy(), mode="lines", name=f"device {device_id}")
+            for device_id in wide.columns
+        ])
+        fig.update_layout(
+            title=meta["title"], xaxis_title="Date", yaxis_title="Wh",
+            legend_title="Batterie", height=500,
+        )
+    else:
+        # Chaque batterie rapportée à son maximum : formes comparables quelle que soit la taille
+        long = normalize_columns(wide, "max").reset_index().melt("date", var_name="device_id", value_name="value")
+        fig = px.line(
+            long, x="date", y="value", facet_row="device_id",
+            title=f"{meta['title']} (normalisé au maximum de chaque batterie)",
+            labels={"value": "part du max", "date": "Date"},
+            height=max(300, 160 * len(wide.columns)),
+        )
+        fig.for_each_annotation(lambda a: a.update(text=a.text.replace("device_id=", "device ")))
+    plotly_chart(fig, f"comparaison:{table_name}", use_container_width=True)
+
+st.caption("Détail d'une batterie : page « Dashboard Zoom Battery ».")
+checkpoint("courbes")
+
+show_trace(trace)
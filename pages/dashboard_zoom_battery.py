@@ -1,72 +1,46 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+import plotly.graph_objects as go
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 import os
-from google.cloud import bigquery
+import shutil
+import tempfile
+
+from downsampling import DEFAULT_MAX_POINTS, METHODS, clip_window, downsample
+from measures import sources
+from rollups import LABELS, RAW, STEPS, choose_resolution
+from timeseries import DIRECTIONS, get_device_series
+from fleet import ZOOM_COLUMNS, json_value, load_fleet_index
+from instrumentation import checkpoint, fragment, plotly_chart, show_trace, start_trace
+from export import FORMATS, export_measures
+from logs import load_log_index, summarize
+from realisation import TABLE_COLUMNS, device_realisation
 
 # Authentification
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"C:\Users\floch\OneDrive\Documents\GCP_key\streamlit_app\beem-data-warehouse-14a923c674a0.json"
-client = bigquery.Client()
 
 st.set_page_config(page_title="Zoom Battery", layout="wide")
 st.title("🔍 Dashboard Zoom sur une batterie")
+trace = start_trace("zoom")
 
 # ========== 📦 Charger infos batteries ==========
-@st.cache_data
-def load_infos():
-    query = """
-        WITH device_user_data AS (
-     SELECT 
-        *
-      FROM `beem-data-warehouse.airbyte_postgresql.battery_device` AS d
-      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.battery_live_data` AS ld ON ld.battery_id = d.id
-      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.house_user` AS hu ON d.house_id = hu.house_id 
-      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.user` AS u ON hu.user_id = u.id
-      LEFT JOIN `beem-data-warehouse.airbyte_postgresql.house` AS h ON h.id = hu.house_id
-      WHERE d.deleted_at IS NULL
-        AND d.replaced_by_id IS NULL
-        AND d.warranty_status = 'activated'
-        AND d.serial_number NOT IN ('021LOLL190154M','021LOLF080008M')
-        --AND u.id NOT IN (22, 4395, 34538)
-        --AND d.hardware_version = 'ampace_v1'
-    ),
-
-    serial_counts AS (
-      SELECT 
-        serial_number,
-        COUNT(*) AS nb
-      FROM device_user_data
-      GROUP BY serial_number
-    ),
-    final AS (
-      SELECT dud.*
-      FROM device_user_data dud
-      JOIN serial_counts sc ON dud.serial_number = sc.serial_number
-      WHERE 
-        -- si le serial est unique, on garde tout
-        sc.nb = 1
-
-        -- si le serial est dupliqué, on garde seulement si email ne se termine pas par @beemenergy
-        OR (
-        sc.nb > 1
-       AND dud.email NOT LIKE '%@beemenergy.com'
-        AND dud.email NOT LIKE '%@beemenergy.fr'
-      )
-    )
-    SELECT * FROM final;
-    """
-    df = client.query(query).to_dataframe()
-    df.rename(columns={"id": "device_id"}, inplace=True)
-    return df.dropna(subset=["device_id"])
-
-infos_df = load_infos()
+# Inventaire et index de recherche d'une même version (rechargée en arrière-plan) :
+# sélecteurs en temps constant
+fleet_index = load_fleet_index()
+checkpoint("chargement")
 
 # ========== 🎛️ Filtres liés ==========
+MAX_OPTIONS = 1000
+
 st.subheader("🎛️ Filtrage batterie (lié par nom / n° série / device)")
 
-lastnames = sorted(infos_df["lastname"].dropna().unique().tolist())
-serials = sorted(infos_df["serial_number"].dropna().unique().tolist())
+search = st.text_input("🔎 Recherche (début du nom ou du numéro de série)")
+lastnames = fleet_index.search_lastnames(search, limit=MAX_OPTIONS)
+serials = fleet_index.search_serials(search, limit=MAX_OPTIONS)
+if MAX_OPTIONS in (len(lastnames), len(serials)):
+    st.caption(f"Listes limitées aux {MAX_OPTIONS} premiers résultats : affiner la recherche.")
 
 col1, col2 = st.columns(2)
 with col1:
@@ -74,30 +48,40 @@ with col1:
 with col2:
     selected_serial = st.selectbox("🖟️ Numéro de série", [""] + serials)
 
-filtered_df = infos_df.copy()
-if selected_name:
-    filtered_df = filtered_df[filtered_df["lastname"] == selected_name]
-if selected_serial:
-    filtered_df = filtered_df[filtered_df["serial_number"] == selected_serial]
-
-available_devices = sorted(filtered_df["device_id"].dropna().unique().tolist())
+available_devices = fleet_index.devices(selected_name or None, selected_serial or None)
 
 if not available_devices:
     st.warning("Aucune correspondance pour cette combinaison.")
     st.stop()
 
-selected_device = st.selectbox("🔌 Choisir un device_id", available_devices)
+if len(available_devices) > MAX_OPTIONS:
+    st.caption(f"{len(available_devices)} batteries : seules les {MAX_OPTIONS} premières sont proposées.")
+    available_devices = available_devices[:MAX_OPTIONS]
+
+# Batterie ouverte par lien (?device_id=..., ex. depuis le contrôle du bilan énergétique)
+linked = st.query_params.get("device_id", "")
+linked_device = int(linked) if linked.isdigit() and int(linked) in fleet_index.position else None
+if linked_device is not None and linked_device not in available_devices and not (selected_name or selected_serial):
+    available_devices = [linked_device, *available_devices]
+
+selected_device = st.selectbox(
+    "🔌 Choisir un device_id", available_devices,
+    index=available_devices.index(linked_device) if linked_device in available_devices else 0,
+)
+# L'URL désigne toujours la batterie affichée (lien partageable)
+st.query_params["device_id"] = str(selected_device)
 
 # Affichage infos liées
-ligne = infos_df[infos_df["device_id"] == selected_device].iloc[0]
+device_info = fleet_index.rows([selected_device], ZOOM_COLUMNS)
+ligne = device_info.iloc[0]
 st.info(
     f"👤 Utilisateur associé : **{ligne['lastname']}**\n\n"
     f"🖟️ Numéro de série : **{ligne['serial_number']}**\n\n"
     f"🔌 device_id sélectionné : **{selected_device}**"
 )
+checkpoint("sélecteurs")
 
 # ========== 🨾 Informations techniques ==========
-device_info = infos_df[infos_df["device_id"] == selected_device]
 st.subheader("🔧 Informations techniques")
 created_at_str = pd.to_datetime(device_info["created_at"].values[0]).strftime("%d/%m/%Y") \
     if pd.notnull(device_info["created_at"].values[0]) else "Inconnue"
@@ -116,43 +100,24 @@ with col4:
 with col5:
     st.metric("SOH (%)", round(device_info["global_soh"].values[0], 1))
 with col6:
-    mode_clean = device_info["working_mode_code"].astype(str).values[0]
-    mode_clean = mode_clean.replace("ampace_v1_", "").replace("ampace_v2_", "")
-    st.metric("Mode de fonctionnement", mode_clean)
+    st.metric("Mode de fonctionnement", device_info["clean_mode"].values[0])
+
+with st.expander("🧬 Versions firmware et numéros de série des composants"):
+    # Colonnes JSON décodées uniquement pour la batterie affichée
+    firmware_versions = json_value(device_info["firmware_versions"].values[0])
+    components = json_value(device_info["component_serial_numbers"].values[0])
+    col7, col8 = st.columns(2)
+    with col7:
+        st.json(firmware_versions or {})
+    with col8:
+        st.json(components or {})
+checkpoint("infos techniques")
 
 # ========== 📜 Comparaison Objectif vs Mesuré ==========
-@st.cache_data
-def load_monthly_data(device_id):
-    device_sql = f"'{device_id}'" if isinstance(device_id, str) else str(device_id)
-
-    query_obj = f"""
-        SELECT * FROM `beem-data-warehouse.airbyte_postgresql.objective_battery`
-        WHERE battery_id = {device_sql}
-    """
-    query_prod = f"""
-        SELECT * FROM `beem-data-warehouse.airbyte_postgresql.monthly_production_battery`
-        WHERE battery_id = {device_sql}
-    """
-
-    df_obj = client.query(query_obj).to_dataframe()
-    df_prod = client.query(query_prod).to_dataframe()
-
-    df_prod["date"] = pd.to_datetime(df_prod["date"])
-    df_prod["month"] = df_prod["date"].dt.month
-    df_prod["year"] = df_prod["date"].dt.year
-
-    latest_per_month = df_prod.groupby("month")["year"].max().reset_index()
-    df_prod = pd.merge(df_prod, latest_per_month, on=["month", "year"], how="inner")
-
-    agg_obj = df_obj.groupby("month")["value"].sum().reset_index().rename(columns={"value": "objective"})
-    agg_prod = df_prod.groupby("month")["watt_hours"].sum().reset_index().rename(columns={"watt_hours": "measured"})
-
-    df_merge = pd.merge(agg_obj, agg_prod, on="month", how="outer").sort_values("month").fillna(0)
-    df_melted = df_merge.melt(id_vars="month", var_name="Source", value_name="Wh")
-
-    return df_melted, df_merge
-
-df_comparaison, df_pivot = load_monthly_data(selected_device)
+df_pivot = device_realisation(selected_device)
+df_comparaison = df_pivot.melt(
+    id_vars="month", value_vars=["objective", "measured"], var_name="Source", value_name="Wh"
+)
 
 # Affichage du graphe Objectif vs Mesuré
 df_comparaison["month"] = df_comparaison["month"].astype(str)
@@ -167,24 +132,21 @@ fig_comp = px.bar(
     labels={"month": "Mois", "Wh": "Énergie (Wh)"},
     category_orders={"month": [str(i) for i in range(1, 13)]}
 )
-st.plotly_chart(fig_comp, use_container_width=True)
+plotly_chart(fig_comp, "objectif_vs_mesure", use_container_width=True)
 
 # Affichage du tableau de taux de réalisation
 st.subheader("📋 Taux de réalisation par mois (%)")
 
-df_pivot["Taux de réalisation (%)"] = (
-    (df_pivot["measured"] / df_pivot["objective"]) * 100
-).round(1).replace([float("inf"), -float("inf")], 0).fillna(0)
-
 st.dataframe(
-    df_pivot[["month", "objective", "measured", "Taux de réalisation (%)"]],
+    df_pivot[TABLE_COLUMNS],
     use_container_width=True,
     height=400
 )
-
-import plotly.graph_objects as go
+checkpoint("réalisation")
 
 # ========== 🗓️ Filtres temporels ==========
+# Entrées partagées par les sections suivantes : les modifier relance la page.
+# Chaque section ci-dessous est un fragment : ses propres widgets ne relancent qu'elle.
 
 st.subheader("⏱️ Plage de temps pour les courbes")
 
@@ -207,50 +169,6 @@ end_datetime = datetime.combine(end_date, end_time)
 start_str = start_datetime.isoformat()
 end_str = end_datetime.isoformat()
 
-# ========== 📈 Courbes multi-sources combinées ==========
-
-sources = {
-    "battery_active_energy_measure": {
-        "title": "Consommation infra-journalière",
-        "y_label": "Wh par batterie",
-        "agg": False,
-    },
-    "battery_active_returned_energy_meter_measure": {
-        "title": "Ré-injection infra-journalière",
-        "y_label": "Wh par batterie",
-        "agg": False,
-    },
-    "battery_active_returned_energy_measure": {
-        "title": "Production solaire (somme MPPT)",
-        "y_label": "Wh total",
-        "agg": True,
-    },
-    "battery_energy_charged_measure": {
-        "title": "Énergie stockée (batterie)",
-        "y_label": "Wh",
-        "agg": False,
-    },
-    "battery_energy_discharged_measure": {
-        "title": "Énergie déstockée (batterie)",
-        "y_label": "Wh",
-        "agg": False,
-    },
-}
-
-@st.cache_data
-def load_data(table_name, device_id, start_dt, end_dt):
-    query = f"""
-        SELECT *
-        FROM `beem-data-warehouse.mongo_beem.{table_name}`
-        WHERE device_id = {device_id}
-          AND DATETIME(date) BETWEEN DATETIME('{start_dt}') AND DATETIME('{end_dt}')
-    """
-    df = client.query(query).to_dataframe()
-    df["date"] = pd.to_datetime(df["date"])
-    return df
-
-st.subheader("📊 Visualisation combinée des mesures")
-
 selected_sources = st.multiselect(
     "Sélectionne les courbes à afficher :",
     options=list(sources.keys()),
@@ -258,121 +176,260 @@ selected_sources = st.multiselect(
     default=list(sources.keys())  # ou [] si tu veux les cacher par défaut
 )
 
-fig = go.Figure()
-
-for table_name in selected_sources:
-    meta = sources[table_name]
-    df = load_data(table_name, selected_device, start_str, end_str)
-
-    if df.empty:
-        st.warning(f"Aucune donnée pour : {meta['title']}")
-        continue
-
-    if meta["agg"] and "device_sub_id" in df.columns:
-        df = df.groupby(["date", "device_id"], as_index=False)["value"].sum()
-
-    df = df.sort_values("date")
-    fig.add_trace(go.Scatter(
-        x=df["date"],
-        y=df["value"],
-        mode="lines",
-        name=meta["title"]
-    ))
-
-fig.update_layout(
-    title="Courbes combinées des mesures",
-    xaxis_title="Date",
-    yaxis_title="Wh",
-    legend_title="Type de mesure",
-    height=600,
-    xaxis=dict(
-        rangeselector=dict(
-            buttons=list([
-                dict(count=1, label="1j", step="day", stepmode="backward"),
-                dict(count=7, label="1s", step="day", stepmode="backward"),
-                dict(count=1, label="1m", step="month", stepmode="backward"),
-                dict(step="all", label="Tout")
-            ])
-        ),
-        rangeslider=dict(visible=False),
-        type="date"
-    )
+# Budget de points par courbe : fixe aussi la résolution lue (agrégats si la période est longue)
+max_points = st.number_input(
+    "Points max par courbe", min_value=200, max_value=50_000,
+    value=DEFAULT_MAX_POINTS, step=500,
 )
+resolution = choose_resolution(start_datetime, end_datetime, max_points)
+checkpoint("filtres temporels")
 
-st.plotly_chart(fig, use_container_width=True)
 
-# ========== 🔍 Valeurs proches d'une date/heure sélectionnée ==========
+# ========== 📈 Courbes multi-sources combinées ==========
 
-st.subheader("📍 Obtenir les valeurs les plus proches d'un moment donné")
+@fragment("courbes")
+def measures_section(device_id, start_datetime, end_datetime, selected_sources, max_points, resolution):
+    st.subheader("📊 Visualisation combinée des mesures")
 
-col1, col2 = st.columns(2)
-with col1:
-    search_date = st.date_input("📅 Date cible", datetime(2025, 4, 15), key="search_date")
-with col2:
-    from datetime import timedelta
+    # Sous-échantillonnage et fenêtre de zoom côté serveur
+    downsampling_method = st.selectbox(
+        "Méthode de sous-échantillonnage", METHODS,
+        format_func={"minmax": "Min/max par intervalle (pics conservés)", "lttb": "LTTB"}.get,
+    )
+
+    if end_datetime > start_datetime:
+        zoom_start, zoom_end = st.slider(
+            "🔎 Fenêtre de zoom (recharge le détail fin sur la fenêtre choisie)",
+            min_value=start_datetime,
+            max_value=end_datetime,
+            value=(start_datetime, end_datetime),
+            format="DD/MM/YY HH:mm",
+        )
+    else:
+        zoom_start, zoom_end = start_datetime, end_datetime
+
+    # Séries du device sur la fenêtre : chargées et normalisées une fois, partagées par les sections.
+    # Fenêtre de zoom trop courte pour les agrégats de la période : rechargée à sa propre résolution
+    zoom_resolution = choose_resolution(zoom_start, zoom_end, max_points)
+    if zoom_resolution == resolution:
+        chart_series = get_device_series(device_id, start_datetime.isoformat(), end_datetime.isoformat(), resolution)
+    else:
+        chart_series = get_device_series(device_id, zoom_start.isoformat(), zoom_end.isoformat(), zoom_resolution)
+    st.caption(
+        f"Résolution affichée : {LABELS[zoom_resolution]}"
+        + ("" if zoom_resolution == RAW else " (somme par intervalle)")
+    )
 
-    search_time = st.time_input(
-        "🕒 Heure cible",
-        datetime(2025, 4, 15, 12, 0).time(),
-        key="search_time",
-        step=timedelta(minutes=5)
+    chart_layout = dict(
+        title="Courbes combinées des mesures",
+        xaxis_title="Date",
+        yaxis_title="Wh",
+        legend_title="Type de mesure",
+        height=600,
+        xaxis=dict(
+            rangeselector=dict(
+                buttons=list([
+                    dict(count=1, label="1j", step="day", stepmode="backward"),
+                    dict(count=7, label="1s", step="day", stepmode="backward"),
+                    dict(count=1, label="1m", step="month", stepmode="backward"),
+                    dict(step="all", label="Tout")
+                ])
+            ),
+            rangeslider=dict(visible=False),
+            type="date"
+        )
     )
 
+    # Les sources sont chargées en parallèle ; le graphe est redessiné à chaque arrivée
+    chart_slot = st.empty()
+    traces = {}
+
+    for table_name, series, error in chart_series.fetch(selected_sources):
+        meta = sources[table_name]
 
-from datetime import timezone
-search_datetime = datetime.combine(search_date, search_time).replace(tzinfo=timezone.utc)
+        if error is not None:
+            st.error(f"Échec du chargement : {meta['title']} ({error})")
+            continue
 
+        if series.empty:
+            st.warning(f"Aucune donnée pour : {meta['title']}")
+            continue
 
-# Fusionner toutes les sources sélectionnées
-closest_rows = []
+        window = downsample(clip_window(series, zoom_start, zoom_end), max_points, downsampling_method)
+        traces[table_name] = go.Scatter(
+            x=window.index,
+            y=window.to_numpy(),
+            mode="lines",
+            name=f"{meta['title']} ({len(window)}/{len(series)} pts)"
+        )
+
+        # Ordre des courbes stable quel que soit l'ordre d'arrivée
+        fig = go.Figure([traces[t] for t in selected_sources if t in traces])
+        fig.update_layout(**chart_layout)
+        plotly_chart(fig, "mesures", chart_slot, use_container_width=True)
+
+    if not traces:
+        chart_slot.plotly_chart(go.Figure(layout=chart_layout), use_container_width=True)
 
-for table_name in selected_sources:
-    meta = sources[table_name]
-    df = load_data(table_name, selected_device, start_str, end_str)
 
-    if df.empty:
-        continue
+measures_section(selected_device, start_datetime, end_datetime, selected_sources, max_points, resolution)
+
+# ========== 🔍 Valeurs proches d'une date/heure sélectionnée ==========
+
+@fragment("valeurs proches")
+def nearest_section(device_id, start_datetime, end_datetime, selected_sources, resolution):
+    st.subheader("📍 Obtenir les valeurs les plus proches d'un moment donné")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        search_date = st.date_input("📅 Date cible", datetime(2025, 4, 15), key="search_date")
+    with col2:
+        search_time = st.time_input(
+            "🕒 Heure cible",
+            datetime(2025, 4, 15, 12, 0).time(),
+            key="search_time",
+            step=timedelta(minutes=5)
+        )
 
-    if meta["agg"] and "device_sub_id" in df.columns:
-        df = df.groupby(["date", "device_id"], as_index=False)["value"].sum()
+    search_naive = datetime.combine(search_date, search_time)
+    search_datetime = search_naive.replace(tzinfo=timezone.utc)
 
-    df = df.sort_values("date")
-    df["time_diff"] = (df["date"] - search_datetime).abs()
-    closest = df.loc[df["time_diff"].idxmin()]
-    closest_rows.append({
-        "Type de mesure": meta["title"],
-        "Date/heure la plus proche": closest["date"],
-        "Valeur": closest["value"]
-    })
+    col3, col4 = st.columns(2)
+    with col3:
+        direction = st.radio(
+            "Échantillon retenu",
+            DIRECTIONS,
+            format_func={"nearest": "Le plus proche", "backward": "Précédent", "forward": "Suivant"}.get,
+            horizontal=True,
+        )
+    with col4:
+        tolerance_min = st.number_input("Tolérance max (minutes, 0 = aucune)", min_value=0, value=0, step=5)
+    tolerance = pd.Timedelta(minutes=tolerance_min) if tolerance_min else None
+
+    # Échantillons réels (mesures brutes, jamais les agrégats) : la période entière n'est lue que
+    # si les courbes l'affichent déjà en brut, sinon une fenêtre étroite autour de l'instant cherché
+    if resolution == RAW:
+        near_start, near_end = start_datetime, end_datetime
+    else:
+        margin = (tolerance or STEPS[resolution]).to_pytimedelta()
+        near_start = max(start_datetime, search_naive - margin)
+        near_end = min(end_datetime, search_naive + margin)
+        st.caption(f"Recherche dans les mesures brutes à ± {margin} de l'instant choisi.")
+    device_series = get_device_series(device_id, near_start.isoformat(), near_end.isoformat(), RAW)
+    if near_start <= near_end:
+        for _ in device_series.fetch(selected_sources):
+            pass
+
+    # Recherche binaire sur les séries triées de toutes les sources sélectionnées
+    values_at = device_series.values_at([search_datetime], selected_sources, direction, tolerance)
+    closest_rows = [
+        {
+            "Type de mesure": sources[table_name]["title"],
+            "Date/heure la plus proche": found["date"].iloc[0],
+            "Valeur": found["value"].iloc[0],
+        }
+        for table_name, found in values_at.items()
+        if not device_series.get(table_name).empty
+    ]
 
-if closest_rows:
-    df_closest = pd.DataFrame(closest_rows)
-    st.dataframe(df_closest, use_container_width=True)
-else:
-    st.info("Aucune donnée disponible pour cette période.")
+    if closest_rows:
+        df_closest = pd.DataFrame(closest_rows)
+        st.dataframe(df_closest, use_container_width=True)
+    else:
+        st.info("Aucune donnée disponible pour cette période.")
+
+    with st.expander("🕐 Valeurs à chaque heure pleine de la période"):
+        # Lecture des mesures brutes de toute la période : uniquement à la demande
+        if not st.toggle("Calculer (lit les mesures brutes de la période)", key="hourly_values"):
+            return
+        period_series = get_device_series(device_id, start_datetime.isoformat(), end_datetime.isoformat(), RAW)
+        for _ in period_series.fetch(selected_sources):
+            pass
+        hour_marks = pd.date_range(
+            pd.Timestamp(start_datetime).ceil("h"), pd.Timestamp(end_datetime).floor("h"), freq="h", tz="UTC"
+        )
+        hourly = period_series.values_at(hour_marks, selected_sources, direction, tolerance)
+        if hourly:
+            df_hourly = pd.DataFrame(
+                {sources[table_name]["title"]: found["value"] for table_name, found in hourly.items()}
+            )
+            df_hourly.index.name = "Heure (UTC)"
+            st.dataframe(df_hourly, use_container_width=True, height=400)
+        else:
+            st.info("Aucune donnée disponible pour cette période.")
+
+
+nearest_section(selected_device, start_datetime, end_datetime, selected_sources, resolution)
+
+# ========== 📤 Export des mesures brutes ==========
+
+@fragment("export")
+def export_section(device_id, start_datetime, end_datetime):
+    with st.expander("📤 Export des mesures brutes (Parquet / CSV)"):
+        export_ids = st.text_input(
+            "device_id à exporter (séparés par des virgules)", str(device_id), key="export_ids"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            export_format = st.radio("Format", FORMATS, horizontal=True, key="export_format")
+        with col2:
+            export_sources = st.multiselect(
+                "Sources", list(sources), default=list(sources),
+                format_func=lambda x: sources[x]["title"], key="export_sources",
+            )
+        st.caption(f"Période : du {start_datetime:%d/%m/%Y %H:%M} au {end_datetime:%d/%m/%Y %H:%M} (UTC)")
+
+        requested = [int(x) for x in export_ids.replace(" ", "").split(",") if x.isdigit()]
+        unknown = [d for d in requested if d not in fleet_index.position]
+        if unknown:
+            st.warning(f"device_id inconnus ignorés : {unknown}")
+        export_devices = [d for d in requested if d in fleet_index.position]
+
+        if st.button("Préparer l'export", disabled=not (export_devices and export_sources)):
+            # Écrit par tranches dans un fichier temporaire : une seule tranche en mémoire
+            export_path = Path(tempfile.mkdtemp(prefix="beem_export_")) / (
+                f"mesures_{len(export_devices)}_batteries_{start_datetime:%Y%m%d}_{end_datetime:%Y%m%d}"
+                f".{export_format}"
+            )
+            bar = st.progress(0.0, text="Export en cours…")
+            rows = export_measures(
+                export_devices, start_datetime.isoformat(), end_datetime.isoformat(), export_path,
+                export_format, export_sources,
+                progress=lambda fraction: bar.progress(fraction, text="Export en cours…"),
+            )
+            previous = st.session_state.get("export_path")
+            if previous:
+                shutil.rmtree(Path(previous).parent, ignore_errors=True)
+            st.session_state["export_path"] = str(export_path)
+            st.session_state["export_rows"] = rows
+
+        if st.session_state.get("export_path") and Path(st.session_state["export_path"]).exists():
+            export_path = Path(st.session_state["export_path"])
+            # Fichier lu seulement au clic, pas à chaque rerun
+            st.download_button(
+                f"⬇️ Télécharger ({st.session_state['export_rows']} lignes, "
+                f"{export_path.stat().st_size / 1e6:.1f} Mo)",
+                export_path.read_bytes,
+                file_name=export_path.name,
+            )
+
+
+export_section(selected_device, start_datetime, end_datetime)
 
 
 # ========== 🪝 Logs Fault/Warning avec filtres ==========
 
-st.subheader("🪝 Logs de type 'fault' ou 'warning'")
-
-@st.cache_data
-def load_logs_all(device_id):
-    query = f"""
-        SELECT date, type, message, cleared, cleared_at, cleared_by
-        FROM `beem-data-warehouse.airbyte_postgresql.battery_device_log`
-        WHERE battery_id = {device_id}
-          AND type IN ('fault', 'warning')
-    """
-    df = client.query(query).to_dataframe()
-    df["date"] = pd.to_datetime(df["date"], utc=True)
-    return df.sort_values("date", ascending=False)
-
-df_logs_all = load_logs_all(selected_device)
-
-if df_logs_all.empty:
-    st.info("Aucun log de type 'fault' ou 'warning' pour cette batterie.")
-else:
+@fragment("logs")
+def logs_section(device_id):
+    st.subheader("🪝 Logs de type 'fault' ou 'warning'")
+
+    # Tranche de l'index des logs du parc (aucune requête par batterie)
+    df_logs_all = load_log_index().for_device(device_id)
+
+    if df_logs_all.empty:
+        st.info("Aucun log de type 'fault' ou 'warning' pour cette batterie.")
+        return
+
     col1, col2 = st.columns(2)
 
     with col1:
@@ -400,46 +457,56 @@ else:
 
     st.dataframe(df_filtered, use_container_width=True, height=400)
 
+
+logs_section(selected_device)
+
 # ========== 📊 Résumé des logs par type + message (filtres indépendants) ==========
-st.subheader("🧮 Total des logs par type et message")
 
-# Filtres spécifiques à ce tableau
-col1, col2 = st.columns(2)
-with col1:
-    type_filter_summary = st.multiselect(
-      "Type de log",
-       options=["fault", "warning"],
-       default=["fault", "warning"],
-       key="type_filter_summary"
-    )
+@fragment("résumé des logs")
+def logs_summary_section(device_id):
+    st.subheader("🧮 Total des logs par type et message")
+    df_logs_all = load_log_index().for_device(device_id)
 
-with col2:
-    min_date_summary = df_logs_all["date"].min().date()
-    max_date_summary = df_logs_all["date"].max().date()
-    date_range_summary = st.date_input(
-    "Plage de dates", [min_date_summary, max_date_summary], key="date_range_summary"
-    )
+    # Filtres spécifiques à ce tableau
+    col1, col2 = st.columns(2)
+    with col1:
+        type_filter_summary = st.multiselect(
+          "Type de log",
+           options=["fault", "warning"],
+           default=["fault", "warning"],
+           key="type_filter_summary"
+        )
 
+    with col2:
+        min_date_summary = df_logs_all["date"].min().date()
+        max_date_summary = df_logs_all["date"].max().date()
+        date_range_summary = st.date_input(
+        "Plage de dates", [min_date_summary, max_date_summary], key="date_range_summary"
+        )
 
-# Application des filtres spécifiques
-df_summary_filtered = df_logs_all.copy()
 
-if type_filter_summary:
-    df_summary_filtered = df_summary_filtered[df_summary_filtered["type"].isin(type_filter_summary)]
+    # Application des filtres spécifiques
+    df_summary_filtered = df_logs_all.copy()
+
+    if type_filter_summary:
+        df_summary_filtered = df_summary_filtered[df_summary_filtered["type"].isin(type_filter_summary)]
+
+    if len(date_range_summary) == 2:
+        start_summary = pd.to_datetime(date_range_summary[0]).tz_localize("UTC")
+        end_summary = pd.to_datetime(date_range_summary[1]).tz_localize("UTC")
+        df_summary_filtered = df_summary_filtered[
+            df_summary_filtered["date"].between(start_summary, end_summary)
+        ]
+
+    # Comptage des combinaisons type + message
+    if not df_summary_filtered.empty:
+        summary = summarize(df_summary_filtered)
+
+        st.dataframe(summary, use_container_width=True)
+    else:
+        st.info("Aucune donnée à afficher pour ce résumé.")
 
-if len(date_range_summary) == 2:
-    start_summary = pd.to_datetime(date_range_summary[0]).tz_localize("UTC")
-    end_summary = pd.to_datetime(date_range_summary[1]).tz_localize("UTC")
-    df_summary_filtered = df_summary_filtered[
-        df_summary_filtered["date"].between(start_summary, end_summary)
-    ]
 
-# Comptage des combinaisons type + message
-if not df_summary_filtered.empty:
-    df_summary_filtered["type_message"] = df_summary_filtered["type"] + " - " + df_summary_filtered["message"]
-    summary = df_summary_filtered.groupby("type_message").size().reset_index(name="count")
-    summary = summary.sort_values(by="count", ascending=False)
+logs_summary_section(selected_device)
 
-    st.dataframe(summary, use_container_width=True)
-else:
-    st.info("Aucune donnée à afficher pour ce résumé.")
\ No newline at end of file
+show_trace(trace)
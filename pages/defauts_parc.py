@@ -0,0 +1,76 @@
+import streamlit as st
+import plotly.express as px
+import os
+
+from fleet import FAULTS_COLUMNS, load_fleet
+from instrumentation import checkpoint, plotly_chart, show_trace, start_trace
+from logs import load_log_index
+
+# Authentification
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"C:\Users\floch\OneDrive\Documents\GCP_key\streamlit_app\beem-data-warehouse-14a923c674a0.json"
+
+st.set_page_config(page_title="Défauts du parc", layout="wide")
+st.title("🪝 Principaux défauts du parc par version")
+trace = start_trace("defauts")
+
+log_index = load_log_index()
+infos_df = load_fleet(FAULTS_COLUMNS)
+checkpoint("chargement")
+
+if not len(log_index):
+    st.info("Aucun log de type 'fault' ou 'warning' sur le parc.")
+    st.stop()
+
+# ========== 🎛️ Filtres ==========
+GROUPINGS = {"firmware_version": "Version firmware", "hardware_version": "Version hardware"}
+
+months = sorted(log_index.df["month"].unique().tolist())
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    grouping = st.selectbox("Regrouper par", list(GROUPINGS), format_func=GROUPINGS.get)
+with col2:
+    type_filter = st.multiselect("Type de log", ["fault", "warning"], default=["fault", "warning"])
+with col3:
+    top_n = st.slider("Nombre de défauts affichés", 5, 50, 15)
+
+first_month, last_month = st.select_slider(
+    "Période (mois)",
+    options=months,
+    value=(months[0], months[-1]),
+    format_func=lambda m: f"{m % 100:02d}/{m // 100}",
+)
+
+# ========== 📊 Top défauts ==========
+battery_groups = infos_df.set_index("device_id")[grouping].astype("string").fillna("Inconnu")
+top = log_index.top_faults(battery_groups, tuple(type_filter), first_month, last_month)
+checkpoint("top défauts")
+
+if top.empty:
+    st.info("Aucun log pour ces filtres.")
+    st.stop()
+
+top_display = top.head(top_n).assign(
+    defaut=lambda d: d["type"].astype(str) + " - " + d["message"].astype(str)
+)
+fig = px.bar(
+    top_display,
+    x="count",
+    y="defaut",
+    color="group",
+    orientation="h",
+    title=f"Défauts les plus fréquents par {GROUPINGS[grouping].lower()}",
+    labels={"count": "Nombre de logs", "defaut": "Défaut", "group": GROUPINGS[grouping]},
+    height=max(400, 30 * len(top_display)),
+)
+fig.update_layout(yaxis=dict(autorange="reversed"))
+plotly_chart(fig, "top_defauts", use_container_width=True)
+
+st.subheader("📋 Détail par version")
+st.dataframe(
+    top.rename(columns={"group": GROUPINGS[grouping], "count": "Nombre de logs"}),
+    use_container_width=True,
+    height=400,
+)
+
+show_trace(trace)
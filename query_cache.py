@@ -0,0 +1,178 @@
+"""Cache disque des résultats de requêtes BigQuery, partagé entre process.
+
+La clé d'un résultat est la requête normalisée (espaces compactés) et ses
+paramètres : les requêtes étant paramétrées, une même lecture donne la même
+clé quel que soit le process. Chaque résultat est la table Arrow typée de
+``BigQuerySource._run``, écrite non compressée dans ``<clé>.arrow`` et relue
+d'un bloc, sans décodage ni projection mémoire : aucun fichier ne reste ouvert,
+il peut être remplacé ou purgé même sous Windows. L'index SQLite
+``index.sqlite`` donne son expiration et sa classe de table. Plusieurs réplicas Streamlit dont
+``BEEM_QUERY_CACHE_DIR`` pointe vers le même dossier se partagent ainsi les
+résultats chauds.
+
+Durée de vie par classe de table (``TTLS``). L'inventaire est en plus invalidé
+dès que le filigrane de synchronisation change (``sync_token``), quel que soit
+le réplica qui le constate. Les requêtes sans classe (filigrane, synchro du
+snapshot) ne sont jamais mises en cache.
+
+Activé par défaut devant BigQuery ; ``BEEM_QUERY_CACHE=0`` le désactive.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from data_source import MEASURE_TABLES, ROLLUP_RESOLUTIONS, daily_table, rollup_table
+from instrumentation import record
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / "cache" / "queries"
+
+# Durée de vie (secondes) par classe de table
+TTLS = {
+    "fleet": 24 * 3600,  # invalidé aussi par le filigrane
+    "monthly": 6 * 3600,
+    "logs": 15 * 60,
+    "measures": 10 * 60,  # le jour en cours bouge encore
+    "rollups": 3600,
+}
+
+# Nom de requête (``BigQuerySource._query``) -> classe de table
+TABLE_CLASSES = {
+    "fleet_inventory": "fleet",
+    "objective_battery": "monthly",
+    "monthly_production_battery": "monthly",
+    "battery_device_log": "logs",
+    **{table: "measures" for table in MEASURE_TABLES},
+    **{daily_table(table): "measures" for table in MEASURE_TABLES},
+    **{rollup_table(table, r): "rollups" for table in MEASURE_TABLES for r in ROLLUP_RESOLUTIONS},
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        table_class TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        rows INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+    CREATE TABLE IF NOT EXISTS tokens (
+        table_class TEXT PRIMARY KEY,
+        token TEXT NOT NULL
+    );
+"""
+
+
+def query_key(query, params=()):
+    """Empreinte de la requête normalisée et de ses paramètres."""
+    normalized = " ".join(query.split())
+    payload = json.dumps([normalized, [list(p) for p in params]], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """Résultats de requêtes en fichiers Arrow, indexés dans SQLite."""
+
+    def __init__(self, root=None):
+        self.root = Path(root or os.environ.get("BEEM_QUERY_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _db(self):
+        # Journal par défaut (pas de WAL) : fonctionne aussi sur un volume réseau
+        db = sqlite3.connect(self.root / "index.sqlite", timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def path(self, key):
+        return self.root / f"{key}.arrow"
+
+    def get(self, key):
+        with self._db() as db:
+            row = db.execute(
+                "SELECT 1 FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return feather.read_table(self.path(key), memory_map=False)
+        except FileNotFoundError:
+            # Purgé entre-temps par un autre process
+            return None
+
+    def put(self, key, name, table_class, table, ttl):
+        path = self.path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            feather.write_feather(table, tmp, compression="uncompressed")
+            os.replace(tmp, path)
+        except (pa.ArrowException, OSError):
+            tmp.unlink(missing_ok=True)
+            return
+        now = time.time()
+        with self._db() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, name, table_class, now, now + ttl, table.num_rows, path.stat().st_size),
+            )
+        self.purge()
+
+    def purge(self):
+        """Supprime les entrées expirées et leurs fichiers ; un fichier verrouillé est repris à la purge suivante."""
+        now = time.time()
+        with self._db() as db:
+            keys = [k for (k,) in db.execute("SELECT key FROM entries WHERE expires_at <= ?", (now,))]
+        removed = []
+        for key in keys:
+            try:
+                self.path(key).unlink(missing_ok=True)
+            except OSError:
+                # Encore ouvert par un autre process (Windows)
+                continue
+            removed.append((key, now))
+        with self._db() as db:
+            # Une entrée réécrite entre-temps n'est plus expirée : elle est gardée
+            db.executemany("DELETE FROM entries WHERE key = ? AND expires_at <= ?", removed)
+
+    def invalidate(self, table_class):
+        with self._db() as db:
+            db.execute("UPDATE entries SET expires_at = 0 WHERE table_class = ?", (table_class,))
+        self.purge()
+
+    def sync_token(self, table_class, token):
+        """Invalide la classe si ``token`` (filigrane) a changé ; renvoie True dans ce cas."""
+        token = json.dumps(token, default=str)
+        with self._db() as db:
+            row = db.execute("SELECT token FROM tokens WHERE table_class = ?", (table_class,)).fetchone()
+            if row is not None and row[0] == token:
+                return False
+            db.execute("INSERT OR REPLACE INTO tokens VALUES (?, ?)", (table_class, token))
+            db.execute("UPDATE entries SET expires_at = 0 WHERE table_class = ?", (table_class,))
+        self.purge()
+        return True
+
+    def fetch(self, name, query, params, run):
+        """Table Arrow partagée de la requête, sinon ``run()`` puis mise en cache."""
+        table_class = TABLE_CLASSES.get(name)
+        if table_class is None:
+            return run()
+        key = query_key(query, params)
+        table = self.get(key)
+        record("cache", f"shared:{name}", hit=table is not None, rows=None if table is None else table.num_rows)
+        if table is None:
+            table = run()
+            self.put(key, name, table_class, table, TTLS[table_class])
+        return table
@@ -0,0 +1,68 @@
+"""Taux de réalisation Objectif vs Production, calculé pour tout le parc.
+
+La table est construite en une passe (deux requêtes pour tout le parc) puis
+découpée par ``battery_id`` : ouvrir une batterie revient à une lecture de
+dictionnaire.
+"""
+import pandas as pd
+import streamlit as st
+
+from data_source import get_data_source
+from instrumentation import traced_cache
+
+RATE_COLUMN = "Taux de réalisation (%)"
+TABLE_COLUMNS = ["month", "objective", "measured", RATE_COLUMN]
+
+
+def build_realisation_table(df_obj, df_prod):
+    """Table (battery_id, month) -> objective, measured, taux de réalisation."""
+    dates = df_prod["date"]
+    prod = pd.DataFrame({
+        "battery_id": df_prod["battery_id"].to_numpy(),
+        "month": dates.dt.month.to_numpy(),
+        "year": dates.dt.year.to_numpy(),
+        "watt_hours": df_prod["watt_hours"].to_numpy(),
+    })
+
+    # Pour chaque (batterie, mois), on ne garde que l'année la plus récente
+    latest_year = prod.groupby(["battery_id", "month"])["year"].transform("max")
+    prod = prod[prod["year"] == latest_year]
+
+    measured = prod.groupby(["battery_id", "month"])["watt_hours"].sum().rename("measured")
+    objective = df_obj.groupby(["battery_id", "month"])["value"].sum().rename("objective")
+
+    table = pd.concat([objective, measured], axis=1).fillna(0).sort_index()
+    table[RATE_COLUMN] = (
+        (table["measured"] / table["objective"]) * 100
+    ).round(1).replace([float("inf"), -float("inf")], 0).fillna(0)
+    return table.reset_index(level="month")
+
+
+@traced_cache(st.cache_resource)
+def load_realisation():
+    source = get_data_source()
+    table = build_realisation_table(source.objectives(), source.monthly_production())
+    by_battery = {
+        battery_id: group.reset_index(drop=True)
+        for battery_id, group in table.groupby(level="battery_id", sort=False)
+    }
+    return table, by_battery
+
+
+def device_realisation(device_id):
+    """Table mensuelle d'une batterie (vide si aucune donnée)."""
+    _, by_battery = load_realisation()
+    return by_battery.get(device_id, pd.DataFrame(columns=TABLE_COLUMNS))
+
+
+def fleet_ranking(month=None):
+    """Classement des batteries par taux de réalisation (un mois, ou cumul annuel)."""
+    table, _ = load_realisation()
+    if month is not None:
+        ranking = table[table["month"] == month].drop(columns="month")
+    else:
+        ranking = table.groupby(level="battery_id")[["objective", "measured"]].sum()
+        ranking[RATE_COLUMN] = (
+            (ranking["measured"] / ranking["objective"]) * 100
+        ).round(1).replace([float("inf"), -float("inf")], 0).fillna(0)
+    return ranking.sort_values(RATE_COLUMN, ascending=False)
@@ -0,0 +1,256 @@
+"""Rapports mensuels par batterie, générés hors Streamlit.
+
+Pour chaque batterie : identité, SOH et cycles (inventaire), taux de
+réalisation du mois (``realisation``), logs fault/warning du mois (``logs``)
+et courbes d'énergie des cinq sources (``timeseries.DeviceSeries``, agrégats
+``rollups`` selon la longueur de la période). Les tables du parc (inventaire,
+objectifs, production, logs) sont lues une fois par le process principal ;
+seules les mesures sont lues par batterie, dans un pool de process.
+``--max-fetches`` borne le nombre de batteries dont les mesures sont lues en
+même temps (chacune lit ses sources en parallèle).
+
+Sorties dans ``--out`` : ``<device_id>.html`` (graphe et tableaux),
+``<device_id>.parquet`` (courbes, une colonne par source),
+``<device_id>.json`` (indicateurs, écrit en dernier) et ``summary.parquet``
+(une ligne par batterie). Une batterie dont le ``.json`` existe est déjà
+faite : relancer la commande reprend là où elle s'est arrêtée.
+
+    python report.py --month 2025-04 --out reports/2025-04 --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from pathlib import Path
+
+import pandas as pd
+
+from data_source import get_data_source
+from fleet import REPORT_COLUMNS, read_fleet
+from logs import LogIndex, summarize
+from measures import sources
+from realisation import RATE_COLUMN, build_realisation_table
+from rollups import choose_resolution
+from timeseries import DeviceSeries
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_MAX_FETCHES = 4
+PROGRESS_EVERY_S = 5
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="fr">
+<head><meta charset="utf-8"><title>Batterie {device_id} - {month}</title></head>
+<body>
+<h1>🔋 Batterie {device_id} - {month}</h1>
+{identity}
+<h2>📋 Réalisation du mois</h2>
+{realisation}
+<h2>🪝 Logs fault / warning</h2>
+{logs}
+<h2>📊 Énergie ({resolution})</h2>
+{figure}
+</body>
+</html>
+"""
+
+# Borne inter-process des lectures de mesures, fixée par ``_init_worker``
+_fetch_slots = None
+
+
+def month_window(month):
+    """``aaaa-mm`` -> (début, fin) ISO du mois, bornes naïves UTC."""
+    start = pd.Period(month, freq="M").start_time
+    end = pd.Period(month, freq="M").end_time
+    return start.isoformat(), end.isoformat()
+
+
+def _python(value):
+    """Valeur JSON (types NumPy/pandas convertis, manquants -> None)."""
+    if value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and value != value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def month_realisation(df_obj, df_prod, month):
+    """Réalisation par batterie du mois ``aaaa-mm`` : production de cette année-là uniquement."""
+    period = pd.Period(month, freq="M")
+    df_prod = df_prod[(df_prod["date"].dt.year == period.year).to_numpy()]
+    realisation = build_realisation_table(df_obj, df_prod)
+    return realisation[realisation["month"] == period.month].drop(columns="month")
+
+
+def device_tasks(month, device_ids=None):
+    """Données du parc découpées par batterie : une tâche (dict) par batterie."""
+    source = get_data_source()
+    fleet = read_fleet()[REPORT_COLUMNS]
+    if device_ids is not None:
+        fleet = fleet[fleet["device_id"].isin(device_ids)]
+
+    period = pd.Period(month, freq="M")
+    realisation = month_realisation(source.objectives(), source.monthly_production(), month)
+    logs = LogIndex(source.logs())
+    yyyymm = period.year * 100 + period.month
+
+    for row in fleet.itertuples(index=False):
+        identity = {column: _python(value) for column, value in zip(REPORT_COLUMNS, row)}
+        device_id = identity["device_id"] = int(identity["device_id"])
+        rates = realisation.loc[device_id] if device_id in realisation.index else None
+        yield {
+            "device_id": device_id,
+            "identity": identity,
+            "realisation": {
+                "objective": None if rates is None else _python(rates["objective"]),
+                "measured": None if rates is None else _python(rates["measured"]),
+                "realisation_rate": None if rates is None else _python(rates[RATE_COLUMN]),
+            },
+            "logs": logs.for_device(device_id, yyyymm, yyyymm),
+        }
+
+
+def _init_worker(fetch_slots):
+    global _fetch_slots
+    _fetch_slots = fetch_slots
+
+
+def _write_atomic(path, write):
+    tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _html(task, month, resolution, wide, faults):
+    import plotly.express as px
+
+    if wide.empty:
+        figure = "<p>Aucune mesure sur le mois.</p>"
+    else:
+        fig = px.line(
+            wide.rename(columns={t: sources[t]["title"] for t in wide.columns}),
+            labels={"value": "Wh", "date": "Date", "variable": "Type de mesure"},
+        )
+        figure = fig.to_html(include_plotlyjs="cdn", full_html=False)
+    return HTML_TEMPLATE.format(
+        device_id=task["device_id"],
+        month=month,
+        resolution=resolution,
+        identity=pd.DataFrame([task["identity"]]).to_html(index=False),
+        realisation=pd.DataFrame([task["realisation"]]).to_html(index=False),
+        logs=faults.to_html(index=False) if not faults.empty else "<p>Aucun log sur le mois.</p>",
+        figure=figure,
+    )
+
+
+def build_report(task, out_dir, month):
+    """Écrit les rapports d'une batterie ; renvoie sa ligne d'indicateurs."""
+    out_dir = Path(out_dir)
+    device_id = task["device_id"]
+    start_dt, end_dt = month_window(month)
+    resolution = choose_resolution(start_dt, end_dt)
+
+    device_series = DeviceSeries(device_id, start_dt, end_dt, resolution)
+    with _fetch_slots or nullcontext():
+        errors = [f"{t} : {e}" for t, _, e in device_series.fetch(list(sources)) if e is not None]
+    if errors:
+        raise RuntimeError(f"device {device_id} : " + " ; ".join(errors))
+    wide = device_series.wide
+
+    faults = summarize(task["logs"]) if not task["logs"].empty else pd.DataFrame()
+    type_counts = task["logs"]["type"].value_counts()
+    summary = {
+        **task["identity"],
+        **task["realisation"],
+        "faults": int(type_counts.get("fault", 0)),
+        "warnings": int(type_counts.get("warning", 0)),
+        "resolution": resolution,
+        **{f"{t}_wh": _python(wide[t].sum()) if t in wide else None for t in sources},
+    }
+
+    _write_atomic(out_dir / f"{device_id}.parquet", lambda p: wide.reset_index().to_parquet(p, index=False))
+    html = _html(task, month, resolution, wide, faults)
+    _write_atomic(out_dir / f"{device_id}.html", lambda p: p.write_text(html, encoding="utf-8"))
+    # Écrit en dernier : marque la batterie comme faite pour la reprise
+    _write_atomic(
+        out_dir / f"{device_id}.json",
+        lambda p: p.write_text(json.dumps(summary, ensure_ascii=False, default=str), encoding="utf-8"),
+    )
+    return summary
+
+
+def write_summary(out_dir):
+    """``summary.parquet`` à partir des indicateurs de toutes les batteries faites."""
+    out_dir = Path(out_dir)
+    rows = [json.loads(p.read_text(encoding="utf-8")) for p in sorted(out_dir.glob("*.json"))]
+    summary = pd.DataFrame(rows)
+    if not summary.empty:
+        summary = summary.sort_values("device_id", ignore_index=True)
+    summary.to_parquet(out_dir / "summary.parquet", index=False)
+    return summary
+
+
+def generate_reports(month, out_dir, device_ids=None, workers=DEFAULT_WORKERS,
+                     max_fetches=DEFAULT_MAX_FETCHES, force=False, log=print):
+    """Rapports du mois pour le parc (ou ``device_ids``) ; renvoie les compteurs du lot."""
+    started = time.perf_counter()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    done = set() if force else {int(p.stem) for p in out_dir.glob("*.json")}
+
+    tasks = [t for t in device_tasks(month, device_ids) if t["device_id"] not in done]
+    log(f"{len(done)} batteries déjà faites, {len(tasks)} à générer "
+        f"({workers} process, {max_fetches} lectures simultanées)")
+
+    context = multiprocessing.get_context()
+    fetch_slots = context.BoundedSemaphore(max_fetches)
+    generated, failures = 0, {}
+    loop_started = last_progress = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(fetch_slots,)) as pool:
+        futures = {pool.submit(build_report, task, out_dir, month): task["device_id"] for task in tasks}
+        for future in as_completed(futures):
+            error = future.exception()
+            if error is None:
+                generated += 1
+            else:
+                failures[futures[future]] = str(error)
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_EVERY_S:
+                last_progress = now
+                log(f"{generated + len(failures)}/{len(tasks)} — "
+                    f"{generated / (now - loop_started):.1f} batteries/s")
+
+    write_summary(out_dir)
+    seconds = time.perf_counter() - started
+    stats = {
+        "generated": generated,
+        "skipped": len(done),
+        "failed": len(failures),
+        "seconds": round(seconds, 3),
+        "devices_per_s": round(generated / seconds, 2) if seconds else None,
+        "failures": failures,
+    }
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapports mensuels par batterie")
+    parser.add_argument("--month", required=True, help="aaaa-mm")
+    parser.add_argument("--out", default=None, help="dossier de sortie (reports/<mois> par défaut)")
+    parser.add_argument("--devices", type=int, nargs="+", default=None)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-fetches", type=int, default=DEFAULT_MAX_FETCHES)
+    parser.add_argument("--force", action="store_true", help="regénère aussi les batteries déjà faites")
+    args = parser.parse_args()
+
+    out_dir = args.out or Path("reports") / args.month
+    stats = generate_reports(args.month, out_dir, args.devices, args.workers, args.max_fetches, args.force)
+    print(f"✅ {stats['generated']} rapports en {stats['seconds']:.1f} s "
+          f"({stats['devices_per_s']} batteries/s), {stats['skipped']} déjà faits")
+    for device_id, error in stats["failures"].items():
+        print(f"❌ {device_id} : {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""Agrégats multi-résolution des tables de mesures.
+
+Pour chaque table de mesures et chaque résolution (15 min, heure, jour), une
+table ``rollup_<table>_<résolution>`` donne par (device_id, intervalle) la
+somme, le min, le max et le nombre de mesures. Pour les sources agrégées par
+MPPT, les valeurs sont d'abord sommées par date (même règle que
+``timeseries.normalize_source``). Chaque résolution est calculée à partir de la
+précédente.
+
+Les agrégats sont matérialisés dans le snapshot local ou dans le dataset
+BigQuery ``beem_rollups`` (partitionné par jour, clusterisé par device) ::
+
+    python rollups.py build --backend snapshot
+    python rollups.py build --backend bigquery
+
+puis tenus à jour par ``refresh``, qui ne recalcule que les derniers jours
+(``--lookback-days``) ; ``data_source.py sync`` reconstruit ceux du snapshot ::
+
+    python rollups.py refresh --backend bigquery --lookback-days 2
+
+``choose_resolution`` retient la résolution la plus grossière qui donne encore
+au moins ``min_points`` intervalles sur la fenêtre : une année s'affiche en
+quelques milliers de points horaires, une semaine reste en mesures brutes.
+Désactivé par défaut : ``BEEM_ROLLUPS=1`` l'active une fois les agrégats
+matérialisés.
+
+``load_rollup`` / ``load_rollup_many`` lisent les agrégats jusqu'à leur
+filigrane (début du dernier intervalle matérialisé) et calculent la suite à
+partir des mesures brutes : un agrégat en retard reste exact, un agrégat
+absent est entièrement calculé depuis les mesures brutes.
+"""
+import argparse
+import os
+from functools import partial
+
+import pandas as pd
+import streamlit as st
+
+from data_source import (
+    MEASURE_TABLES, ROLLUP_COLUMNS, ROLLUP_DATASET, ROLLUP_RESOLUTIONS, SnapshotSource,
+    _query_parameters, get_data_source, rollup_table, utc_timestamp,
+)
+from downsampling import DEFAULT_MAX_POINTS
+from instrumentation import traced_cache
+from measures import sources
+
+RAW = "raw"
+STEPS = {
+    "15min": pd.Timedelta(minutes=15),
+    "1h": pd.Timedelta(hours=1),
+    "1D": pd.Timedelta(days=1),
+}
+LABELS = {RAW: "mesures brutes", "15min": "15 minutes", "1h": "horaire", "1D": "journalière"}
+
+# Durée de vie du filigrane lu par les pages ; un filigrane ancien ne coûte que plus de mesures brutes
+WATERMARK_TTL_S = 10 * 60
+# Jours recalculés par ``refresh`` avant le filigrane (mesures arrivées en retard)
+REFRESH_LOOKBACK = pd.Timedelta(days=2)
+
+
+def choose_resolution(start, end, min_points=DEFAULT_MAX_POINTS):
+    """Résolution la plus grossière donnant au moins ``min_points`` intervalles, sinon ``RAW``."""
+    if os.environ.get("BEEM_ROLLUPS", "0") != "1":
+        return RAW
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for resolution in reversed(ROLLUP_RESOLUTIONS):
+        if span / STEPS[resolution] >= min_points:
+            return resolution
+    return RAW
+
+
+def build_rollup(df, table_name, resolution=ROLLUP_RESOLUTIONS[0]):
+    """Agrégats d'une table de mesures brutes (tous devices) à la résolution donnée."""
+    # Dates naïves en UTC pendant le calcul
+    values = pd.DataFrame({
+        "device_id": df["device_id"].to_numpy(),
+        "date": df["date"].dt.tz_localize(None).to_numpy(),
+        "value": df["value"].to_numpy(dtype=float),
+    })
+    if sources[table_name]["agg"]:
+        values = values.groupby(["device_id", "date"], as_index=False)["value"].sum()
+    values["date"] = values["date"].dt.floor(STEPS[resolution])
+    rollup = values.groupby(["device_id", "date"])["value"].agg(["sum", "min", "max", "count"])
+    rollup = rollup.add_prefix("value_").reset_index()
+    rollup["date"] = rollup["date"].dt.tz_localize("UTC")
+    return rollup[ROLLUP_COLUMNS]
+
+
+def coarsen(rollup, resolution):
+    """Agrège une table d'agrégats vers une résolution plus grossière."""
+    rollup = rollup.assign(date=rollup["date"].dt.floor(STEPS[resolution]))
+    return rollup.groupby(["device_id", "date"], as_index=False).agg(
+        value_sum=("value_sum", "sum"),
+        value_min=("value_min", "min"),
+        value_max=("value_max", "max"),
+        value_count=("value_count", "sum"),
+    )[ROLLUP_COLUMNS]
+
+
+@traced_cache(partial(st.cache_data, ttl=WATERMARK_TTL_S))
+def rollup_watermark(kind, table_name, resolution, _source):
+    """``_source.rollup_watermark`` en cache par (backend, table, résolution)."""
+    return _source.rollup_watermark(table_name, resolution)
+
+
+def _with_raw_tail(read_rollup, read_tail, source, table_name, resolution, start_dt, end_dt):
+    """Agrégats avant le filigrane, mesures brutes agrégées (``read_tail``) à partir de lui."""
+    start, end = utc_timestamp(start_dt), utc_timestamp(end_dt)
+    watermark = rollup_watermark(source.name, table_name, resolution, source)
+    parts = []
+    if watermark is not None and watermark > start:
+        rollup = read_rollup(start_dt, end_dt)
+        parts.append(rollup[rollup["date"] < watermark])
+    tail_start = start if watermark is None else max(start, watermark)
+    if tail_start <= end:
+        tail = read_tail(tail_start.tz_localize(None).isoformat(), end_dt)
+        # Même sémantique que les agrégats : intervalles commençant dans la fenêtre
+        parts.append(tail[tail["date"] >= start])
+    return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+
+def _aggregated(read_raw, table_name, resolution):
+    """Lecteur des mesures brutes agrégées côté client à ``resolution``."""
+    def read(start_dt, end_dt):
+        return build_rollup(read_raw(start_dt, end_dt), table_name, resolution)
+
+    return read
+
+
+def load_rollup(source, resolution, table_name, device_id, start_dt, end_dt):
+    """Agrégats d'une batterie (``ROLLUP_COLUMNS``), complétés par les mesures brutes."""
+    return _with_raw_tail(
+        partial(source.rollup, table_name, resolution, device_id),
+        _aggregated(partial(source.measures, table_name, device_id), table_name, resolution),
+        source, table_name, resolution, start_dt, end_dt,
+    )
+
+
+def load_rollup_many(source, resolution, table_name, device_ids, start_dt, end_dt):
+    """``load_rollup`` pour plusieurs batteries (``None`` : tout le parc).
+
+    En journalier, la suite est sommée par le backend (``daily_many``) et non
+    rapatriée en mesures brutes.
+    """
+    if resolution == "1D":
+        read_tail = partial(source.daily_many, table_name, device_ids)
+    else:
+        read_tail = _aggregated(partial(source.measures_many, table_name, device_ids), table_name, resolution)
+    return _with_raw_tail(
+        partial(source.rollup_many, table_name, resolution, device_ids),
+        read_tail, source, table_name, resolution, start_dt, end_dt,
+    )
+
+
+def materialize_snapshot(snapshot=None, tables=MEASURE_TABLES):
+    """Écrit les agrégats de chaque table de mesures du snapshot ; renvoie les lignes par table."""
+    snapshot = snapshot or SnapshotSource()
+    rows = {}
+    for table_name in tables:
+        rollup = build_rollup(snapshot._read(table_name), table_name, ROLLUP_RESOLUTIONS[0])
+        for resolution in ROLLUP_RESOLUTIONS:
+            if resolution != ROLLUP_RESOLUTIONS[0]:
+                rollup = coarsen(rollup, resolution)
+            snapshot.write(rollup_table(table_name, resolution), rollup)
+            rows[rollup_table(table_name, resolution)] = len(rollup)
+    return rows
+
+
+def refresh_snapshot(snapshot=None, tables=MEASURE_TABLES, lookback=REFRESH_LOOKBACK):
+    """Recalcule les agrégats du snapshot à partir de ``lookback`` avant leur filigrane."""
+    snapshot = snapshot or SnapshotSource()
+    rows = {}
+    for table_name in tables:
+        watermark = snapshot.rollup_watermark(table_name, ROLLUP_RESOLUTIONS[0])
+        if watermark is None:
+            rows.update(materialize_snapshot(snapshot, [table_name]))
+            continue
+        # Début de jour : aligné sur toutes les résolutions
+        since = (watermark - lookback).floor("1D")
+        raw = snapshot._read(table_name)
+        rollup = build_rollup(raw[raw["date"] >= since], table_name, ROLLUP_RESOLUTIONS[0])
+        for resolution in ROLLUP_RESOLUTIONS:
+            if resolution != ROLLUP_RESOLUTIONS[0]:
+                rollup = coarsen(rollup, resolution)
+            name = rollup_table(table_name, resolution)
+            kept = snapshot._read(name, columns=ROLLUP_COLUMNS)
+            snapshot.write(name, pd.concat([kept[kept["date"] < since], rollup], ignore_index=True))
+            rows[name] = len(rollup)
+    return rows
+
+
+def _rollup_select(project, table_name, resolution, previous=None, since=False):
+    """SELECT d'un agrégat, depuis la table brute ou l'agrégat ``previous`` (à partir de ``@since``)."""
+    seconds = int(STEPS[resolution].total_seconds())
+    if previous is None:
+        where = "WHERE TIMESTAMP(date) >= @since" if since else ""
+        if sources[table_name]["agg"]:
+            base = (f"SELECT device_id, TIMESTAMP(date) AS date, SUM(value) AS value "
+                    f"FROM `{project}.mongo_beem.{table_name}` {where} GROUP BY 1, 2")
+        else:
+            base = (f"SELECT device_id, TIMESTAMP(date) AS date, value "
+                    f"FROM `{project}.mongo_beem.{table_name}` {where}")
+        stats = ("SUM(value)", "MIN(value)", "MAX(value)", "COUNT(value)")
+    else:
+        where = "WHERE date >= @since" if since else ""
+        base = f"SELECT * FROM `{project}.{ROLLUP_DATASET}.{previous}` {where}"
+        stats = ("SUM(value_sum)", "MIN(value_min)", "MAX(value_max)", "SUM(value_count)")
+    columns = ",\n          ".join(f"{expr} AS {name}" for expr, name in zip(stats, ROLLUP_COLUMNS[2:]))
+    return f"""
+        WITH base AS ({base})
+        SELECT
+          device_id,
+          TIMESTAMP_SECONDS(DIV(UNIX_SECONDS(date), {seconds}) * {seconds}) AS date,
+          {columns}
+        FROM base
+        GROUP BY 1, 2
+    """
+
+
+def rollup_sql(project, table_name, resolution, previous=None):
+    """Requête de création d'un agrégat, depuis la table brute ou l'agrégat ``previous``."""
+    return f"""
+        CREATE OR REPLACE TABLE `{project}.{ROLLUP_DATASET}.{rollup_table(table_name, resolution)}`
+        PARTITION BY DATE(date)
+        CLUSTER BY device_id
+        AS
+        {_rollup_select(project, table_name, resolution, previous)}
+    """
+
+
+def refresh_sql(project, table_name, resolution, previous=None):
+    """Script remplaçant les intervalles d'un agrégat à partir de ``@since``."""
+    target = f"`{project}.{ROLLUP_DATASET}.{rollup_table(table_name, resolution)}`"
+    return f"""
+        DELETE FROM {target} WHERE date >= @since;
+        INSERT INTO {target} ({", ".join(ROLLUP_COLUMNS)})
+        {_rollup_select(project, table_name, resolution, previous, since=True)};
+    """
+
+
+def materialize_bigquery(source=None, tables=MEASURE_TABLES):
+    """(Re)crée les tables d'agrégats dans le dataset ``beem_rollups`` (créé au besoin)."""
+    source = source or get_data_source("bigquery")
+    source.client.create_dataset(f"{source.project}.{ROLLUP_DATASET}", exists_ok=True)
+    for table_name in tables:
+        previous = None
+        for resolution in ROLLUP_RESOLUTIONS:
+            source.client.query(rollup_sql(source.project, table_name, resolution, previous)).result()
+            previous = rollup_table(table_name, resolution)
+            print(f"✅ {ROLLUP_DATASET}.{previous}")
+
+
+def refresh_bigquery(source=None, tables=MEASURE_TABLES, lookback=REFRESH_LOOKBACK):
+    """Recalcule les agrégats BigQuery à partir de ``lookback`` avant leur filigrane."""
+    from google.cloud import bigquery
+
+    source = source or get_data_source("bigquery")
+    for table_name in tables:
+        watermark = source.rollup_watermark(table_name, ROLLUP_RESOLUTIONS[0])
+        if watermark is None:
+            materialize_bigquery(source, [table_name])
+            continue
+        since = (watermark - lookback).floor("1D")
+        config = bigquery.QueryJobConfig(
+            query_parameters=_query_parameters([("since", "TIMESTAMP", since.to_pydatetime())])
+        )
+        previous = None
+        for resolution in ROLLUP_RESOLUTIONS:
+            source.client.query(
+                refresh_sql(source.project, table_name, resolution, previous), job_config=config
+            ).result()
+            previous = rollup_table(table_name, resolution)
+            print(f"✅ {ROLLUP_DATASET}.{previous} depuis {since:%Y-%m-%d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matérialisation des agrégats de mesures")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="(Re)calcule les agrégats")
+    refresh = sub.add_parser("refresh", help="Recalcule les derniers jours des agrégats")
+    refresh.add_argument("--lookback-days", type=float, default=REFRESH_LOOKBACK.days)
+    for command in (build, refresh):
+        command.add_argument("--backend", choices=["snapshot", "bigquery"], default="snapshot")
+        command.add_argument("--snapshot-dir", default=None)
+        command.add_argument("--table", action="append", choices=MEASURE_TABLES)
+    args = parser.parse_args()
+
+    tables = args.table or MEASURE_TABLES
+    if args.command == "build" and args.backend == "snapshot":
+        for table, n in materialize_snapshot(SnapshotSource(args.snapshot_dir), tables).items():
+            print(f"✅ {table} : {n} lignes")
+    elif args.command == "build":
+        materialize_bigquery(tables=tables)
+    elif args.backend == "snapshot":
+        lookback = pd.Timedelta(days=args.lookback_days)
+        for table, n in refresh_snapshot(SnapshotSource(args.snapshot_dir), tables, lookback).items():
+            print(f"✅ {table} : {n} lignes recalculées")
+    else:
+        refresh_bigquery(tables=tables, lookback=pd.Timedelta(days=args.lookback_days))
+
+
+if __name__ == "__main__":
+    main()
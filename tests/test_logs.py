@@ -0,0 +1,29 @@
+import pandas as pd
+
+from logs import LogIndex
+
+
+def _logs():
+    return pd.DataFrame({
+        "battery_id": [1, 1, 2, 2, 3],
+        "date": pd.to_datetime(
+            ["2025-03-10", "2025-04-02", "2025-04-05", "2025-05-01", "2025-04-20"], utc=True
+        ),
+        "type": pd.Categorical(["fault", "warning", "fault", "fault", "info"]),
+        "message": pd.Categorical(["BMS", "Temp", "BMS", "BMS", "Boot"]),
+        "cleared": [True, False, False, True, False],
+        "cleared_at": pd.NaT,
+        "cleared_by": None,
+    })
+
+
+def test_top_faults_month_window():
+    groups = pd.Series(["v1", "v1", "v2"], index=[1, 2, 3])
+    top = LogIndex(_logs()).top_faults(groups, ("fault", "warning"), 202504, 202504)
+    assert top["count"].sum() == 2
+    assert set(top["message"].astype(str)) == {"BMS", "Temp"}
+
+
+def test_for_device_most_recent_first():
+    logs = LogIndex(_logs()).for_device(2)
+    assert list(logs["date"].dt.month) == [5, 4]
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from realisation import RATE_COLUMN
+from report import month_realisation
+
+
+def _two_years():
+    objectives = pd.DataFrame({
+        "battery_id": [1, 1, 2],
+        "mppt_id": [1, 1, 1],
+        "month": [4, 5, 4],
+        "value": [1000.0, 1000.0, 2000.0],
+    })
+    production = pd.DataFrame({
+        "battery_id": [1, 1, 1, 2],
+        "mppt_id": [1, 1, 1, 1],
+        "date": pd.to_datetime(["2024-04-01", "2025-04-01", "2025-05-01", "2025-04-01"], utc=True),
+        "watt_hours": [500.0, 900.0, 800.0, 1500.0],
+    })
+    return objectives, production
+
+
+def test_month_realisation_uses_requested_year():
+    objectives, production = _two_years()
+
+    april_2024 = month_realisation(objectives, production, "2024-04")
+    assert april_2024.loc[1, "measured"] == 500.0
+    assert april_2024.loc[1, RATE_COLUMN] == 50.0
+    # Aucune production en avril 2024 : pas celle de 2025
+    assert april_2024.loc[2, "measured"] == 0
+
+    april_2025 = month_realisation(objectives, production, "2025-04")
+    assert april_2025.loc[1, "measured"] == 900.0
+    assert april_2025.loc[2, "measured"] == 1500.0
+    assert april_2025.index.is_unique
@@ -0,0 +1,192 @@
+"""Séries temporelles d'une batterie sur une fenêtre, construites une seule fois.
+
+Un ``DeviceSeries`` regroupe les sources de mesures d'un (device, fenêtre) :
+chaque source est normalisée une fois (agrégation MPPT, index de dates trié et
+unique) et toutes sont alignées sur un index commun via ``wide``. Le graphe,
+le tableau des valeurs proches et les métriques dérivées lisent cet objet
+sans refaire les calculs à chaque rerun.
+
+Hors mesures brutes (``resolution`` de ``rollups``), chaque source est la
+somme par intervalle lue dans la table d'agrégats correspondante
+(``rollups.load_rollup`` : complétée par les mesures brutes après son filigrane).
+"""
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from data_source import get_data_source
+from instrumentation import record
+from measures import fetch_concurrently, sources
+from rollups import RAW, load_rollup
+
+CACHE_MAX_ENTRIES = 16
+
+DIRECTIONS = ("nearest", "backward", "forward")
+
+
+def normalize_source(table_name, df):
+    """Série ``date -> value`` triée, agrégation MPPT appliquée."""
+    if df.empty:
+        index = pd.DatetimeIndex([], tz="UTC", name="date")
+        return pd.Series(index=index, dtype=float, name=table_name)
+
+    values = pd.Series(df["value"].to_numpy(), index=pd.DatetimeIndex(df["date"], name="date"))
+    if sources[table_name]["agg"] and "device_sub_id" in df.columns:
+        series = values.groupby(level="date").sum()
+    else:
+        series = values.sort_index()
+        # Doublons éventuels de synchronisation : on garde la dernière valeur
+        if not series.index.is_unique:
+            series = series.groupby(level="date").last()
+    return series.rename(table_name)
+
+
+def normalize_rollup(table_name, df):
+    """Série ``début d'intervalle -> somme`` d'une table d'agrégats."""
+    dates = pd.DatetimeIndex(df["date"], name="date")
+    series = pd.Series(df["value_sum"].to_numpy(dtype=float), index=dates, name=table_name)
+    return series.sort_index()
+
+
+def _as_utc(timestamps):
+    targets = pd.DatetimeIndex(pd.to_datetime(timestamps))
+    return targets.tz_localize("UTC") if targets.tz is None else targets.tz_convert("UTC")
+
+
+def nearest(series, targets, direction="nearest", tolerance=None):
+    """Échantillon de ``series`` le plus proche de chaque instant cible.
+
+    Recherche binaire sur l'index trié : O(log n) par cible, sans colonne
+    temporaire. ``direction`` vaut ``"nearest"``, ``"backward"`` (échantillon
+    précédent ou égal) ou ``"forward"`` (suivant ou égal). Au-delà de
+    ``tolerance`` (``Timedelta``), la cible reste sans valeur.
+
+    Renvoie un DataFrame indexé par les cibles, colonnes ``date`` et ``value``.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Direction inconnue : {direction}")
+    targets = _as_utc(targets)
+    result = pd.DataFrame(
+        {"date": pd.Series(pd.NaT, index=targets, dtype="datetime64[ns, UTC]"),
+         "value": np.nan},
+        index=targets,
+    )
+    if series.empty or targets.empty:
+        return result
+
+    index = series.index.tz_convert("UTC").as_unit("ns").asi8
+    t = targets.as_unit("ns").asi8
+    n = len(index)
+
+    after = np.searchsorted(index, t, side="left")        # premier >= cible
+    before = np.searchsorted(index, t, side="right") - 1  # dernier <= cible
+    if direction == "backward":
+        pos = before
+    elif direction == "forward":
+        pos = after
+    else:
+        prev = np.clip(before, 0, n - 1)
+        nxt = np.clip(after, 0, n - 1)
+        pos = np.where(np.abs(index[prev] - t) <= np.abs(index[nxt] - t), prev, nxt)
+
+    valid = (pos >= 0) & (pos < n)
+    pos = np.clip(pos, 0, n - 1)
+    if tolerance is not None:
+        valid &= np.abs(index[pos] - t) <= pd.Timedelta(tolerance).value
+
+    result.loc[valid, "date"] = series.index[pos[valid]]
+    result.loc[valid, "value"] = series.to_numpy()[pos[valid]]
+    return result
+
+
+class DeviceSeries:
+    """Sources de mesures d'une batterie sur [start, end], alignées sur le temps."""
+
+    def __init__(self, device_id, start_dt, end_dt, resolution=RAW):
+        self.device_id = device_id
+        self.start_dt = start_dt
+        self.end_dt = end_dt
+        self.resolution = resolution
+        self.series = {}
+        self._wide = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, table_name):
+        return table_name in self.series
+
+    def get(self, table_name):
+        return self.series.get(table_name)
+
+    def add(self, table_name, series):
+        with self._lock:
+            self.series[table_name] = series
+            self._wide = None
+
+    @property
+    def wide(self):
+        """DataFrame indexé par date (union triée), une colonne par source."""
+        with self._lock:
+            if self._wide is None:
+                if self.series:
+                    self._wide = pd.concat(self.series.values(), axis=1).sort_index()
+                else:
+                    self._wide = pd.DataFrame(index=pd.DatetimeIndex([], tz="UTC", name="date"))
+            return self._wide
+
+    def values_at(self, targets, tables, direction="nearest", tolerance=None):
+        """``nearest`` appliqué à chaque source disponible : {table: DataFrame(date, value)}."""
+        return {
+            table_name: nearest(self.series[table_name], targets, direction, tolerance)
+            for table_name in tables
+            if table_name in self
+        }
+
+    def fetch(self, tables, **kwargs):
+        """Complète les sources manquantes ; renvoie ``(table, série, erreur)`` au fil de l'eau.
+
+        Les sources déjà présentes sont renvoyées immédiatement, les autres
+        sont chargées en parallèle (``measures.fetch_concurrently``).
+        """
+        missing = []
+        for table_name in tables:
+            if table_name in self:
+                yield table_name, self.series[table_name], None
+            else:
+                missing.append(table_name)
+
+        source = get_data_source()
+        if self.resolution == RAW:
+            loader, normalize = source.measures, normalize_source
+        else:
+            loader = functools.partial(load_rollup, source, self.resolution)
+            normalize = normalize_rollup
+        for table_name, df, error in fetch_concurrently(
+            loader, missing, self.device_id, self.start_dt, self.end_dt, **kwargs
+        ):
+            if error is not None:
+                yield table_name, None, error
+                continue
+            series = normalize(table_name, df)
+            self.add(table_name, series)
+            yield table_name, series, None
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_device_series(device_id, start_dt, end_dt, resolution=RAW):
+    """``DeviceSeries`` partagé par le process pour ce (device, fenêtre, résolution) — cache LRU."""
+    key = (get_data_source().name, device_id, start_dt, end_dt, resolution)
+    with _cache_lock:
+        device_series = _cache.get(key)
+        record("cache", "get_device_series", hit=device_series is not None)
+        if device_series is None:
+            device_series = _cache[key] = DeviceSeries(device_id, start_dt, end_dt, resolution)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return device_series